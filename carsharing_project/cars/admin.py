@@ -6,6 +6,23 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
 from django.utils.html import format_html
 from .models import *
+from .images import annotate_image_info
+from .exports import EXPORT_BY_MODEL, CSV, XLSX, xlsx_available, export_response
+
+
+@admin.action(description='Выгрузить выбранные в CSV')
+def export_as_csv(modeladmin, request, queryset):
+    return export_response(EXPORT_BY_MODEL[queryset.model], queryset, CSV)
+
+
+@admin.action(description='Выгрузить выбранные в XLSX')
+def export_as_xlsx(modeladmin, request, queryset):
+    if not xlsx_available():
+        modeladmin.message_user(request, 'Для выгрузки в XLSX установите openpyxl', level='error')
+        return None
+    return export_response(EXPORT_BY_MODEL[queryset.model], queryset, XLSX)
+
+
 class CarImageInline(admin.TabularInline):
     """Инлайн для загрузки нескольких изображений автомобиля"""
     model = CarImage
@@ -16,7 +33,7 @@ class CarImageInline(admin.TabularInline):
     def image_preview(self, obj):
         if obj and obj.image:
             return format_html('<img src="{}" style="max-height: 100px; max-width: 100px; border-radius: 5px;" />',
-                               obj.image.url)
+                               obj.thumbnail_url)
         return "Нет изображения"
 
     image_preview.short_description = "Превью"
@@ -93,7 +110,7 @@ class CarAdmin(admin.ModelAdmin):
             html = '<div style="display: flex; flex-wrap: wrap; gap: 10px;">'
             for img in images:
                 html += f'<div style="text-align: center;">'
-                html += f'<img src="{img.image.url}" style="max-height: 100px; max-width: 100px; border-radius: 5px;" />'
+                html += f'<img src="{img.thumbnail_url}" style="max-height: 100px; max-width: 100px; border-radius: 5px;" />'
                 if img.is_main:
                     html += '<br><span class="badge bg-success">Главное</span>'
                 if img.caption:
@@ -116,7 +133,7 @@ class CarImageAdmin(admin.ModelAdmin):
     def image_preview(self, obj):
         if obj and obj.image:
             return format_html('<img src="{}" style="max-height: 50px; max-width: 50px; border-radius: 5px;" />',
-                               obj.image.url)
+                               obj.thumbnail_url)
         return "Нет изображения"
 
     image_preview.short_description = "Превью"
@@ -151,6 +168,7 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ('status', 'payment_type', 'payment_date')
     search_fields = ('booking__id', 'transaction_id')
     readonly_fields = ('payment_date',)
+    actions = [export_as_csv, export_as_xlsx]
 
 
 # Модель отзыва
@@ -263,7 +281,7 @@ class CustomUserAdmin(BaseUserAdmin):
 # Обновленный CarAdmin с проверкой прав
 class CarAdmin(admin.ModelAdmin):
     list_display = ('brand', 'model', 'year', 'status', 'price_per_hour',
-                    'partner', 'get_owner_group', 'created_at')
+                    'partner', 'get_owner_group', 'main_image_preview', 'created_at')
     list_filter = ('status', 'category', 'transmission', 'year')
     search_fields = ('brand', 'model', 'description', 'address')
     readonly_fields = ('created_at', 'updated_at')
@@ -295,9 +313,19 @@ class CarAdmin(admin.ModelAdmin):
 
     get_owner_group.short_description = 'Группа владельца'
 
+    def main_image_preview(self, obj):
+        """Превью главного изображения (из аннотации queryset, без запросов)"""
+        main_image = obj.get_main_image_info()
+        if main_image:
+            return format_html('<img src="{}" style="max-height: 50px; max-width: 50px; border-radius: 5px;" />',
+                               main_image['thumbnail_url'])
+        return "Нет фото"
+
+    main_image_preview.short_description = "Фото"
+
     # Ограничение видимости для менеджеров
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        qs = annotate_image_info(super().get_queryset(request))
         if request.user.is_superuser:
             return qs
         elif request.user.groups.filter(name='Менеджеры').exists():
@@ -331,6 +359,7 @@ class BookingAdmin(admin.ModelAdmin):
     search_fields = ('client__email', 'client__first_name',
                      'client__last_name', 'car__brand', 'car__model')
     readonly_fields = ('created_at', 'updated_at')
+    actions = [export_as_csv, export_as_xlsx]
 
     fieldsets = (
         ('Основная информация', {
@@ -375,6 +404,34 @@ class BookingAdmin(admin.ModelAdmin):
         return False
 
 
+# Выплаты партнерам
+class PartnerPayoutAdmin(admin.ModelAdmin):
+    list_display = ('id', 'partner', 'amount', 'status', 'payment_method', 'created_at', 'processed_at')
+    list_filter = ('status', 'payment_method', 'created_at')
+    search_fields = ('partner__username', 'partner__email', 'transaction_id')
+    list_select_related = ('partner',)
+    readonly_fields = ('created_at',)
+    actions = [export_as_csv, export_as_xlsx]
+
+
+# Журнал партнеров только для чтения: исправления - через reconcile_ledger
+class PartnerLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'partner', 'kind', 'amount', 'balance_after', 'booking', 'payout', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('partner__username', 'partner__email', 'description')
+    list_select_related = ('partner',)
+    readonly_fields = [field.name for field in PartnerLedgerEntry._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 # Регистрация моделей в админке
 admin.site.register(User, UserAdmin)
 admin.site.register(TransmissionType)
@@ -388,6 +445,8 @@ admin.site.register(CarImage, CarImageAdmin)  # Регистрируем мод
 admin.site.register(Booking, BookingAdmin)
 admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Review, ReviewAdmin)
+admin.site.register(PartnerPayout, PartnerPayoutAdmin)
+admin.site.register(PartnerLedgerEntry, PartnerLedgerEntryAdmin)
 
 # Настройка заголовков админки
 admin.site.site_header = 'Администрирование Каршеринга'
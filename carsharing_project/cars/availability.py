@@ -0,0 +1,247 @@
+"""
+Проверка доступности автомобилей.
+
+Для каждого автомобиля в памяти процесса строится индекс интервалов
+блокирующих бронирований: отсортированные начала и префиксный максимум
+окончаний. Проверка пересечения сводится к одному бинарному поиску.
+Индекс сбрасывается сигналами при любой записи бронирования; поколение
+индекса хранится в кеше Django, поэтому при нескольких процессах кеш
+должен быть общим (CACHE_URL, см. carsharing_project/database.py). Индекс
+к тому же живет не дольше INDEX_TTL секунд, так что пропущенный сброс
+устаревает сам; окончательную проверку пересечений при бронировании
+делает БД (cars.booking).
+
+Занятость автомобиля "сейчас" не записывается в Car.status при каждом
+бронировании, а вычисляется по бронированиям и сохраняется во флаге
+Car.available_now. Флаг пересчитывается после изменения бронирований
+автомобиля, при переходах планировщика и массово (refresh_available_now).
+"""
+import datetime
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import Booking, Car
+from .statuses import booking_statuses, car_statuses, BLOCKING_STATUSES, BOOKABLE_CAR_STATUSES
+
+GENERATION_KEY = 'availability:generation:{car_id}'
+_CALENDAR_KEY = 'availability:calendar:{car_id}:{generation}:{day}:{days}'
+
+# Горизонт календаря занятости (дней вперед)
+CALENDAR_HORIZON_DAYS = 180
+CALENDAR_CACHE_TIMEOUT = 300
+
+# Сколько секунд индекс автомобиля используется без перечитывания
+INDEX_TTL = 60
+
+# Длительность "момента" при проверке занятости в точке времени
+_INSTANT = datetime.timedelta(microseconds=1)
+
+_lock = threading.Lock()
+_index = {}
+
+
+class CarIntervalIndex:
+    """Статический индекс интервалов бронирований одного автомобиля"""
+
+    def __init__(self, intervals, generation):
+        intervals = sorted(intervals)
+        self.generation = generation
+        self.expires = time.monotonic() + INDEX_TTL
+        self.intervals = intervals
+        self.starts = [start for start, end in intervals]
+        # max_ends[i] - максимальное окончание среди первых i + 1 интервалов
+        self.max_ends = []
+        current = None
+        for start, end in intervals:
+            if current is None or end > current:
+                current = end
+            self.max_ends.append(current)
+
+    def overlaps(self, start_date, end_date):
+        """Есть ли интервал, пересекающийся с [start_date, end_date)"""
+        # Интервалы, начинающиеся строго до end_date
+        count = bisect_left(self.starts, end_date)
+        if not count:
+            return False
+        return self.max_ends[count - 1] > start_date
+
+    def overlapping(self, start_date, end_date):
+        """Все интервалы, пересекающиеся с [start_date, end_date)"""
+        count = bisect_left(self.starts, end_date)
+        return [(start, end) for start, end in self.intervals[:count] if end > start_date]
+
+
+def _aware(value):
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _generation(car_id):
+    return cache.get(GENERATION_KEY.format(car_id=car_id), 0)
+
+
+def _load_intervals(car_id):
+    # Индекс кешируется до следующего сброса, поэтому читаем всегда с
+    # основной БД: реплика может отставать
+    return Booking.objects.using(DEFAULT_DB_ALIAS).filter(
+        car_id=car_id,
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
+    ).values_list('start_date', 'end_date')
+
+
+def get_car_index(car_id):
+    """Возвращает актуальный индекс интервалов автомобиля"""
+    generation = _generation(car_id)
+    index = _index.get(car_id)
+    if index is not None and index.generation == generation and index.expires > time.monotonic():
+        return index
+
+    index = CarIntervalIndex(list(_load_intervals(car_id)), generation)
+    with _lock:
+        _index[car_id] = index
+    return index
+
+
+def invalidate_car(car_id):
+    """Сбрасывает индекс автомобиля после изменения его бронирований"""
+    key = GENERATION_KEY.format(car_id=car_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+    with _lock:
+        _index.pop(car_id, None)
+
+
+def is_car_available(car, start_date, end_date, exclude_booking=None):
+    """Проверяет, свободен ли автомобиль на интервал [start_date, end_date)"""
+    car_id = getattr(car, 'pk', car)
+    start_date = _aware(start_date)
+    end_date = _aware(end_date)
+
+    if exclude_booking is not None:
+        # Редкий случай (редактирование бронирования) - идем напрямую в БД
+        return not Booking.objects.filter(
+            car_id=car_id,
+            start_date__lt=end_date,
+            end_date__gt=start_date,
+            status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
+        ).exclude(pk=getattr(exclude_booking, 'pk', exclude_booking)).exists()
+
+    return not get_car_index(car_id).overlaps(start_date, end_date)
+
+
+def filter_available(cars, start_date, end_date):
+    """
+    Оставляет в queryset только автомобили, свободные на интервал.
+    Выполняется одним запросом с анти-соединением (NOT EXISTS) по бронированиям.
+    """
+    start_date = _aware(start_date)
+    end_date = _aware(end_date)
+    busy = Booking.objects.filter(
+        car=OuterRef('pk'),
+        start_date__lt=end_date,
+        end_date__gt=start_date,
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
+    )
+    return cars.filter(~Exists(busy))
+
+
+def bookable_cars():
+    """Автомобили, которые можно бронировать (не на обслуживании и не сняты)"""
+    return Car.objects.filter(status_id__in=car_statuses.ids(BOOKABLE_CAR_STATUSES))
+
+
+def available_cars(start_date, end_date):
+    """Все доступные автомобили, свободные на интервал"""
+    return filter_available(bookable_cars(), start_date, end_date)
+
+
+def is_car_free_at(car_id, instant=None):
+    """Свободен ли автомобиль в момент instant (по индексу интервалов)"""
+    instant = _aware(instant or timezone.now())
+    return not get_car_index(car_id).overlaps(instant, instant + _INSTANT)
+
+
+def refresh_car_availability(car_id, now=None):
+    """Пересчитывает Car.available_now одного автомобиля; True, если флаг изменился"""
+    status_id = Car.objects.filter(pk=car_id).values_list('status_id', flat=True).first()
+    if status_id is None:
+        return False
+    available = (
+        status_id in car_statuses.ids(BOOKABLE_CAR_STATUSES) and is_car_free_at(car_id, now)
+    )
+    return bool(
+        Car.objects.filter(pk=car_id).exclude(available_now=available).update(available_now=available)
+    )
+
+
+def refresh_available_now(car_ids=None, now=None):
+    """
+    Массово пересчитывает Car.available_now (для car_ids или всех автомобилей).
+    UPDATE затрагивают только строки, у которых флаг изменился.
+    Возвращает (освобождено, занято).
+    """
+    now = _aware(now or timezone.now())
+    cars = Car.objects.all() if car_ids is None else Car.objects.filter(pk__in=car_ids)
+    busy = Exists(Booking.objects.filter(
+        car=OuterRef('pk'),
+        start_date__lte=now,
+        end_date__gt=now,
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
+    ))
+    bookable = Q(status_id__in=car_statuses.ids(BOOKABLE_CAR_STATUSES))
+
+    freed = cars.filter(bookable, ~busy, available_now=False).update(available_now=True)
+    taken = cars.filter(busy, available_now=True).update(available_now=False)
+    taken += cars.exclude(bookable).filter(available_now=True).update(available_now=False)
+    return freed, taken
+
+
+def merge_date_ranges(intervals):
+    """
+    Склеивает интервалы бронирований в непересекающиеся диапазоны дат.
+    Соседние дни объединяются: [1-3] и [4-5] дают [1-5].
+    """
+    days = sorted(
+        (timezone.localtime(start).date(), timezone.localtime(end).date())
+        for start, end in intervals
+    )
+    merged = []
+    for start, end in days:
+        if merged and start <= merged[-1][1] + datetime.timedelta(days=1):
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def get_unavailable_ranges(car_id, days=CALENDAR_HORIZON_DAYS):
+    """
+    Занятые диапазоны дат автомобиля на ближайшие days дней.
+    Результат кешируется до следующего изменения бронирований автомобиля.
+    """
+    today = timezone.localdate()
+    key = _CALENDAR_KEY.format(
+        car_id=car_id, generation=_generation(car_id), day=today.isoformat(), days=days
+    )
+    ranges = cache.get(key)
+    if ranges is not None:
+        return ranges
+
+    now = timezone.now()
+    intervals = get_car_index(car_id).overlapping(now, now + datetime.timedelta(days=days))
+    ranges = [
+        {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d')}
+        for start, end in merge_date_ranges(intervals)
+    ]
+    cache.set(key, ranges, CALENDAR_CACHE_TIMEOUT)
+    return ranges
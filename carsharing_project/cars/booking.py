@@ -0,0 +1,236 @@
+"""
+Создание и завершение бронирований.
+
+Проверка пересечений, запись бронирования и создание предоплаты
+выполняются в одной транзакции. Первый оператор транзакции - UPDATE
+строки автомобиля: он блокирует ее (в SQLite - берет блокировку записи),
+поэтому параллельные запросы на один автомобиль проверяют пересечения
+по очереди. Проигравшие получают BookingResult с кодом конфликта.
+Car.status при этом не меняется: занятость вычисляется по бронированиям
+(см. cars.availability).
+
+Чтобы сотни одновременных попыток не выстраивались в очередь за
+блокировкой, запрос сначала проверяется без блокировки: после фиксации
+первого бронирования остальные отсекаются, не открывая транзакцию.
+Индекс доступности может отставать, поэтому отказ по нему
+подтверждается запросом к БД.
+
+activate_bookings() и complete_bookings() - переходы жизненного цикла
+для набора бронирований (планировщик run_scheduler);
+complete_expired_bookings() - пакетное завершение всех прошедших аренд
+(команда update_booking_statuses).
+"""
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import is_car_available, invalidate_car, refresh_available_now
+from .ledger import sync_bookings
+from .models import Booking, Car, Payment
+from .pricing import quote
+from .revenue import apply_booking_changes, booking_contribution
+from .stats import invalidate_dashboard_stats
+from .statuses import (
+    car_statuses, booking_statuses, payment_types, payment_statuses,
+    BOOKABLE_CAR_STATUSES, BOOKING_CONFIRMED, BOOKING_ACTIVE, BOOKING_COMPLETED,
+    BLOCKING_STATUSES, PAYMENT_PREPAYMENT, PAYMENT_PENDING,
+)
+
+# Коды результата
+CREATED = 'created'
+CAR_NOT_AVAILABLE = 'car_not_available'
+DATES_TAKEN = 'dates_taken'
+
+MESSAGES = {
+    CAR_NOT_AVAILABLE: 'Автомобиль временно недоступен для бронирования',
+    DATES_TAKEN: 'Автомобиль недоступен на выбранные даты',
+}
+
+
+class BookingResult:
+    """Результат попытки бронирования"""
+
+    def __init__(self, code, booking=None, conflicts=()):
+        self.code = code
+        self.booking = booking
+        # Бронирования, пересекающиеся с запрошенным интервалом
+        self.conflicts = list(conflicts)
+
+    @property
+    def ok(self):
+        return self.code == CREATED
+
+    @property
+    def message(self):
+        return MESSAGES.get(self.code, '')
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return f'<BookingResult {self.code}>'
+
+
+def _overlapping(car_id, start_date, end_date):
+    return Booking.objects.filter(
+        car_id=car_id,
+        start_date__lt=end_date,
+        end_date__gt=start_date,
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
+    )
+
+
+def create_booking(booking):
+    """
+    Сохраняет несохраненное бронирование (car, client и даты уже заданы)
+    вместе с предоплатой; статус автомобиля не меняется.
+    """
+    car = booking.car
+    bookable_ids = car_statuses.ids(BOOKABLE_CAR_STATUSES)
+
+    # Быстрый отказ без блокировок
+    if car.status_id not in bookable_ids:
+        return BookingResult(CAR_NOT_AVAILABLE)
+    if (not is_car_available(car, booking.start_date, booking.end_date)
+            and _overlapping(car.pk, booking.start_date, booking.end_date).exists()):
+        return BookingResult(DATES_TAKEN)
+
+    price = quote(car, booking.start_date, booking.end_date)
+    booking.calculated_price = price.amount
+    booking.status = booking_statuses.get(BOOKING_CONFIRMED)
+
+    with transaction.atomic():
+        # Блокировка автомобиля до конца транзакции; 0 строк - автомобиль
+        # успели снять с бронирования
+        locked = Car.objects.filter(pk=car.pk, status_id__in=bookable_ids).update(
+            updated_at=timezone.now()
+        )
+        if not locked:
+            return BookingResult(CAR_NOT_AVAILABLE)
+
+        conflicts = list(_overlapping(car.pk, booking.start_date, booking.end_date)[:5])
+        if conflicts:
+            return BookingResult(DATES_TAKEN, conflicts=conflicts)
+
+        booking.save()
+        Payment.objects.create(
+            booking=booking,
+            amount=price.prepayment,
+            payment_type=payment_types.get(PAYMENT_PREPAYMENT),
+            status=payment_statuses.get(PAYMENT_PENDING)
+        )
+
+    return BookingResult(CREATED, booking=booking)
+
+
+def _invalidate_cars(car_ids):
+    for car_id in car_ids:
+        invalidate_car(car_id)
+
+
+def activate_bookings(booking_ids, now=None):
+    """
+    Переводит подтвержденные бронирования, аренда по которым началась,
+    в "активно" и отмечает их автомобили занятыми.
+    Возвращает количество измененных бронирований.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        started = Booking.objects.filter(
+            pk__in=booking_ids,
+            status_id=booking_statuses.id(BOOKING_CONFIRMED),
+            start_date__lte=now
+        )
+        car_ids = set(started.values_list('car_id', flat=True))
+        if not car_ids:
+            return 0
+        done = started.update(status_id=booking_statuses.id(BOOKING_ACTIVE), updated_at=now)
+        refresh_available_now(car_ids, now)
+
+    invalidate_dashboard_stats()
+    return done
+
+
+def complete_bookings(booking_ids, now=None):
+    """
+    Завершает активные бронирования из booking_ids, срок которых истек,
+    и пересчитывает доступность их автомобилей.
+    Возвращает (завершено бронирований, освобождено автомобилей).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = Booking.objects.filter(
+            pk__in=booking_ids,
+            status_id=booking_statuses.id(BOOKING_ACTIVE),
+            end_date__lte=now
+        )
+        rows = list(expired.select_for_update().values_list(
+            'pk', 'car_id', 'start_date', 'end_date', 'calculated_price'
+        ))
+        if not rows:
+            return 0, 0
+        completed_ids = [row[0] for row in rows]
+        car_ids = {row[1] for row in rows}
+
+        completed_id = booking_statuses.id(BOOKING_COMPLETED)
+        done = expired.filter(pk__in=completed_ids).update(status_id=completed_id, updated_at=now)
+        # Доход партнеров и помесячная сводка ведутся в той же транзакции
+        sync_bookings(completed_ids)
+        apply_booking_changes([
+            (None, booking_contribution(completed_id, *row[1:])) for row in rows
+        ])
+        # Автомобиль с другой текущей арендой останется занятым
+        freed = refresh_available_now(car_ids, now)[0]
+        # update() не вызывает сигналы - сбрасываем индекс доступности сами
+        transaction.on_commit(lambda: _invalidate_cars(car_ids))
+
+    invalidate_dashboard_stats()
+    return done, freed
+
+
+def complete_expired_bookings(now=None, batch_size=1000, time_limit=None,
+                              dry_run=False, on_batch=None):
+    """
+    Переводит все активные бронирования с прошедшей датой окончания в
+    "завершено", а их автомобили - в "доступен".
+
+    Работает пакетами по batch_size бронирований (complete_bookings).
+    Если задан time_limit (секунды), новые пакеты после его истечения не
+    начинаются; оставшиеся бронирования обработает следующий запуск.
+    on_batch(stats) вызывается после каждого пакета.
+
+    Возвращает словарь со статистикой.
+    """
+    now = now or timezone.now()
+    expired = Booking.objects.filter(
+        status_id=booking_statuses.id(BOOKING_ACTIVE), end_date__lte=now
+    )
+    stats = {'bookings': 0, 'cars': 0, 'batches': 0, 'finished': True, 'elapsed': 0.0}
+    started = time.monotonic()
+
+    if dry_run:
+        stats['bookings'] = expired.count()
+        stats['cars'] = expired.values('car_id').distinct().count()
+        stats['elapsed'] = time.monotonic() - started
+        return stats
+
+    while True:
+        if time_limit is not None and time.monotonic() - started >= time_limit:
+            stats['finished'] = False
+            break
+
+        booking_ids = list(expired.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not booking_ids:
+            break
+        done, freed = complete_bookings(booking_ids, now)
+
+        stats['bookings'] += done
+        stats['cars'] += freed
+        stats['batches'] += 1
+        stats['elapsed'] = time.monotonic() - started
+        if on_batch:
+            on_batch(stats)
+
+    stats['elapsed'] = time.monotonic() - started
+    return stats
@@ -0,0 +1,205 @@
+"""
+Массовый импорт автомобилей партнера из CSV.
+
+Каждая строка проверяется правилами PartnerCarForm (CarImportForm).
+Коробка передач и категория задаются названием; справочники загружаются
+один раз на весь файл. Проверенные строки записываются bulk_create
+пакетами по batch_size в одной транзакции; поисковый индекс и счетчики
+дашбордов обновляются один раз после записи (bulk_create не вызывает
+сигналы).
+
+Первая строка файла - заголовки: имена полей (brand, model, year, ...)
+или их подписи из формы ("Марка", "Модель", ...). Разделитель - запятая
+или точка с запятой.
+
+По умолчанию файл импортируется целиком или не импортируется совсем,
+чтобы после исправления ошибок его можно было загрузить повторно без
+дублей; partial=True записывает только строки без ошибок.
+"""
+import csv
+import io
+
+from django.db import transaction
+
+from .forms import CarImportForm
+from .models import Car, CarCategory, TransmissionType
+from .search import get_backend as get_search_backend
+from .stats import invalidate_dashboard_stats
+from .statuses import car_statuses, CAR_AVAILABLE
+
+DEFAULT_BATCH_SIZE = 200
+# Ограничение для загрузки через сайт
+MAX_UPLOAD_ROWS = 5000
+
+IMPORT_FIELDS = CarImportForm.Meta.fields + ['transmission', 'category']
+
+
+class RowError:
+    """Ошибки одной строки файла"""
+
+    def __init__(self, line, errors, values=None):
+        self.line = line
+        # {поле: [сообщения]}; ошибки строки целиком - под ключом '__all__'
+        self.errors = errors
+        self.values = values or {}
+
+    @property
+    def messages(self):
+        return [
+            f'{field}: {message}' if field != '__all__' else message
+            for field, messages in self.errors.items() for message in messages
+        ]
+
+    def __repr__(self):
+        return f'<RowError строка {self.line}: {"; ".join(self.messages)}>'
+
+
+class ImportResult:
+    """Итог импорта: сколько строк прочитано и создано, ошибки по строкам"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def __repr__(self):
+        return f'<ImportResult {self.created}/{self.rows}, ошибок: {len(self.errors)}>'
+
+
+def _header_map():
+    """Имя поля или подпись из формы (в нижнем регистре) -> имя поля"""
+    mapping = {field: field for field in IMPORT_FIELDS}
+    labels = dict(CarImportForm.Meta.labels)
+    labels.update(transmission='Коробка передач', category='Категория')
+    for field, label in labels.items():
+        if field in IMPORT_FIELDS:
+            mapping[label.lower()] = field
+    return mapping
+
+
+def _reader(text):
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(io.StringIO(text), dialect)
+
+
+def read_rows(file):
+    """
+    Читает CSV (путь, бинарный или текстовый файл).
+    Возвращает (поля по колонкам, итератор (номер строки, значения)).
+    """
+    if isinstance(file, str):
+        with open(file, encoding='utf-8-sig', newline='') as handle:
+            text = handle.read()
+    else:
+        text = file.read()
+        if isinstance(text, bytes):
+            text = text.decode('utf-8-sig')
+        text = text.lstrip('\ufeff')
+
+    reader = _reader(text)
+    header = next(reader, [])
+    mapping = _header_map()
+    columns = [mapping.get(name.strip().lower()) for name in header]
+
+    def rows():
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            yield reader.line_num, values
+
+    return columns, rows()
+
+
+def _lookups():
+    """Справочники одним проходом: {название: объект}"""
+    return (
+        {item.name: item for item in TransmissionType.objects.all()},
+        {item.name: item for item in CarCategory.objects.all()},
+    )
+
+
+def import_cars(file, partner, batch_size=DEFAULT_BATCH_SIZE, partial=False,
+                dry_run=False, max_rows=None):
+    """
+    Импортирует автомобили partner из CSV-файла file.
+    Возвращает ImportResult; при dry_run только проверяет строки.
+    """
+    result = ImportResult()
+    try:
+        columns, rows = read_rows(file)
+    except UnicodeDecodeError:
+        result.errors.append(RowError(1, {'__all__': ['Файл должен быть в кодировке UTF-8']}))
+        return result
+
+    missing = [
+        field for field in IMPORT_FIELDS
+        if field not in columns and CarImportForm.base_fields[field].required
+    ]
+    if missing:
+        result.errors.append(RowError(1, {'__all__': [
+            f'В заголовке нет обязательных колонок: {", ".join(missing)}'
+        ]}))
+        return result
+
+    transmissions, categories = _lookups()
+    status = car_statuses.get(CAR_AVAILABLE)
+    cars = []
+
+    for line, values in rows:
+        result.rows += 1
+        if max_rows is not None and result.rows > max_rows:
+            result.errors.append(RowError(line, {'__all__': [
+                f'В файле больше {max_rows} автомобилей, разделите его на части'
+            ]}))
+            break
+
+        data = {
+            field: value.strip()
+            for field, value in zip(columns, values) if field is not None
+        }
+        form = CarImportForm(data, transmissions=transmissions, categories=categories)
+        if not form.is_valid():
+            errors = {field: list(messages) for field, messages in form.errors.items()}
+            result.errors.append(RowError(line, errors, data))
+            continue
+
+        car = form.save(commit=False)
+        car.transmission = form.cleaned_data['transmission']
+        car.category = form.cleaned_data['category']
+        car.partner = partner
+        car.status = status
+        cars.append(car)
+
+    if dry_run or (result.errors and not partial):
+        return result
+
+    with transaction.atomic():
+        for start in range(0, len(cars), batch_size):
+            created = Car.objects.bulk_create(cars[start:start + batch_size])
+            result.created += len(created)
+
+        def reindex():
+            get_search_backend().index_cars([car for car in cars if car.pk])
+
+        transaction.on_commit(reindex)
+
+    invalidate_dashboard_stats()
+    return result
+
+
+def write_error_report(result, file):
+    """Отчет об ошибках в CSV: номер строки, поле, сообщение"""
+    writer = csv.writer(file)
+    writer.writerow(['Строка', 'Поле', 'Ошибка'])
+    for error in result.errors:
+        for field, messages in error.errors.items():
+            for message in messages:
+                writer.writerow([error.line, '' if field == '__all__' else field, message])
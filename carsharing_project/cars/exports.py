@@ -0,0 +1,260 @@
+"""
+Выгрузка бронирований, платежей и выплат в CSV и XLSX.
+
+Строки читаются через values_list(...).iterator(chunk_size), то есть без
+создания моделей и без загрузки всего queryset в память. CSV отдается
+StreamingHttpResponse по мере чтения; XLSX пишется в режиме write_only
+openpyxl во временный файл и отдается файлом (формат zip нельзя
+отдавать по частям). openpyxl необязателен: без него доступен только CSV.
+
+Одни и те же генераторы используют страницы выгрузки, действия админки
+и команда export_bookings. Видимость строк - как в BookingAdmin:
+менеджеры видят все, партнер - свои автомобили, клиент - свои
+бронирования.
+"""
+import csv
+import datetime
+import tempfile
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl необязателен
+    openpyxl = None
+
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Booking, Payment, PartnerPayout
+
+CSV = 'csv'
+XLSX = 'xlsx'
+
+DEFAULT_CHUNK_SIZE = 2000
+# Сколько строк CSV склеивается в один фрагмент ответа
+CSV_ROWS_PER_CHUNK = 500
+
+
+class Export:
+    """Описание выгрузки: модель, колонки и поля для ограничения видимости"""
+
+    def __init__(self, name, model, columns, partner_field, client_field=None,
+                 date_field='created_at', choices=None):
+        self.name = name
+        self.model = model
+        # (заголовок, поле для values_list)
+        self.columns = columns
+        self.partner_field = partner_field
+        self.client_field = client_field
+        self.date_field = date_field
+        # {поле: {значение: подпись}} для полей с choices
+        self.choices = choices or {}
+
+    @property
+    def headers(self):
+        return [header for header, field in self.columns]
+
+    @property
+    def fields(self):
+        return [field for header, field in self.columns]
+
+
+EXPORTS = {
+    'bookings': Export(
+        'bookings', Booking,
+        columns=[
+            ('ID', 'id'),
+            ('Создано', 'created_at'),
+            ('Клиент', 'client__username'),
+            ('Email клиента', 'client__email'),
+            ('ID автомобиля', 'car_id'),
+            ('Марка', 'car__brand'),
+            ('Модель', 'car__model'),
+            ('Год', 'car__year'),
+            ('Партнер', 'car__partner__username'),
+            ('Начало', 'start_date'),
+            ('Окончание', 'end_date'),
+            ('Статус', 'status__name'),
+            ('Стоимость', 'calculated_price'),
+            ('Итоговая стоимость', 'final_price'),
+            ('Пробег в начале', 'start_mileage'),
+            ('Пробег в конце', 'end_mileage'),
+        ],
+        partner_field='car__partner',
+        client_field='client',
+        date_field='start_date',
+    ),
+    'payments': Export(
+        'payments', Payment,
+        columns=[
+            ('ID', 'id'),
+            ('Дата', 'payment_date'),
+            ('Бронирование', 'booking_id'),
+            ('Клиент', 'booking__client__username'),
+            ('Марка', 'booking__car__brand'),
+            ('Модель', 'booking__car__model'),
+            ('Тип', 'payment_type__name'),
+            ('Статус', 'status__name'),
+            ('Сумма', 'amount'),
+            ('ID транзакции', 'transaction_id'),
+        ],
+        partner_field='booking__car__partner',
+        client_field='booking__client',
+        date_field='payment_date',
+    ),
+    'payouts': Export(
+        'payouts', PartnerPayout,
+        columns=[
+            ('ID', 'id'),
+            ('Создано', 'created_at'),
+            ('Партнер', 'partner__username'),
+            ('Сумма', 'amount'),
+            ('Статус', 'status'),
+            ('Способ', 'payment_method'),
+            ('ID транзакции', 'transaction_id'),
+            ('Обработано', 'processed_at'),
+        ],
+        partner_field='partner',
+        choices={
+            'status': dict(PartnerPayout._meta.get_field('status').choices),
+            'payment_method': dict(PartnerPayout._meta.get_field('payment_method').choices),
+        },
+    ),
+}
+
+EXPORT_BY_MODEL = {export.model: export for export in EXPORTS.values()}
+
+
+def xlsx_available():
+    return openpyxl is not None
+
+
+def sees_everything(user):
+    return user.is_superuser or user.is_staff or user.groups.filter(name='Менеджеры').exists()
+
+
+def is_partner_user(user):
+    return user.is_partner or user.groups.filter(name='Партнеры').exists()
+
+
+def scoped_queryset(export, user):
+    """Строки, которые user может выгрузить (как BookingAdmin.get_queryset)"""
+    queryset = export.model.objects.all()
+    if sees_everything(user):
+        return queryset
+    if is_partner_user(user):
+        return queryset.filter(**{export.partner_field: user})
+    if export.client_field:
+        return queryset.filter(**{export.client_field: user})
+    return queryset.none()
+
+
+def _parse_filter_date(value):
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f'Неверная дата: {value} (нужно ГГГГ-ММ-ДД)')
+    return date
+
+
+def filter_queryset(export, queryset, status=None, date_from=None, date_to=None):
+    """
+    Фильтры страниц бронирований: статус и даты (ГГГГ-ММ-ДД).
+    Неверные значения - ValueError.
+    """
+    if status and status != 'all':
+        try:
+            status = export.model._meta.get_field('status').to_python(status)
+        except ValidationError:
+            raise ValueError(f'Неверный статус: {status}')
+        queryset = queryset.filter(status=status)
+    if date_from:
+        queryset = queryset.filter(**{f'{export.date_field}__date__gte': _parse_filter_date(date_from)})
+    if date_to:
+        queryset = queryset.filter(**{f'{export.date_field}__date__lte': _parse_filter_date(date_to)})
+    return queryset
+
+
+# Начало ячейки, с которого Excel читает формулу
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _format(value):
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Текст из формы (имя, марка) не должен исполняться как формула
+        return "'" + value
+    return '' if value is None else value
+
+
+def iter_rows(export, queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Строки выгрузки (списки значений) без заголовка"""
+    choice_columns = [
+        (position, export.choices[field])
+        for position, field in enumerate(export.fields) if field in export.choices
+    ]
+    rows = queryset.order_by('pk').values_list(*export.fields)
+    for row in rows.iterator(chunk_size=chunk_size):
+        row = [_format(value) for value in row]
+        for position, labels in choice_columns:
+            row[position] = labels.get(row[position], row[position])
+        yield row
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(export, queryset, chunk_size=DEFAULT_CHUNK_SIZE, bom=True):
+    """Фрагменты CSV; BOM нужен Excel, чтобы распознать UTF-8"""
+    writer = csv.writer(_Echo())
+    yield ('\ufeff' if bom else '') + writer.writerow(export.headers)
+    chunk = []
+    for row in iter_rows(export, queryset, chunk_size):
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= CSV_ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_xlsx(export, queryset, file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Записывает XLSX в file (путь или бинарный файл)"""
+    if openpyxl is None:
+        raise RuntimeError('Для выгрузки в XLSX установите openpyxl')
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=export.name)
+    sheet.append(export.headers)
+    for row in iter_rows(export, queryset, chunk_size):
+        sheet.append(row)
+    workbook.save(file)
+
+
+def export_filename(export, fmt):
+    return f'{export.name}-{timezone.localdate():%Y-%m-%d}.{fmt}'
+
+
+def export_response(export, queryset, fmt=CSV, chunk_size=DEFAULT_CHUNK_SIZE):
+    """HTTP-ответ с выгрузкой queryset в формате fmt"""
+    filename = export_filename(export, fmt)
+    if fmt == XLSX:
+        file = tempfile.TemporaryFile()
+        write_xlsx(export, queryset, file, chunk_size)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename=filename)
+
+    response = StreamingHttpResponse(
+        iter_csv(export, queryset, chunk_size), content_type='text/csv; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -4,6 +4,7 @@ from .models import User, Car, Booking, Review, SupportChat, SupportMessage,  Pa
 from django.core.exceptions import ValidationError
 import datetime
 from django.utils import timezone
+from .availability import is_car_available
 
 class UserRegisterForm(UserCreationForm):
     email = forms.EmailField(label='Email')
@@ -136,14 +137,7 @@ class BookingForm(forms.ModelForm):
 
         # Проверяем пересечения с другими бронированиями
         if car:
-            overlapping = Booking.objects.filter(
-                car=car,
-                start_date__lt=end_date,
-                end_date__gt=start_date,
-                status__name__in=['подтверждено', 'активно']
-            ).exists()
-
-            if overlapping:
+            if not is_car_available(car, start_date, end_date):
                 raise forms.ValidationError("Автомобиль уже забронирован на выбранные даты")
 
         return cleaned_data
@@ -328,4 +322,72 @@ class PayoutRequestForm(forms.ModelForm):
             'amount': 'Сумма выплаты (₽)',
             'payment_method': 'Способ получения',
             'notes': 'Комментарий',
-        }
\ No newline at end of file
+        }
+
+class CarImportForm(PartnerCarForm):
+    """
+    Строка CSV-импорта автомобилей (cars.car_import): правила
+    PartnerCarForm, но коробка передач и категория задаются названием
+    и ищутся в заранее загруженных справочниках, без запроса на строку.
+    """
+    transmission = forms.CharField(label='Коробка передач')
+    category = forms.CharField(label='Категория', required=False)
+
+    class Meta(PartnerCarForm.Meta):
+        fields = [
+            field for field in PartnerCarForm.Meta.fields
+            if field not in ('transmission', 'category', 'image')
+        ]
+
+    def __init__(self, *args, transmissions=None, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {название: объект}
+        self.transmissions = transmissions or {}
+        self.categories = categories or {}
+
+    def _lookup(self, field, choices):
+        """Точное совпадение названия, иначе - без учета регистра"""
+        name = (self.cleaned_data.get(field) or '').strip()
+        if not name:
+            return None
+        if name in choices:
+            return choices[name]
+
+        matches = [obj for key, obj in choices.items() if key.lower() == name.lower()]
+        if len(matches) > 1:
+            raise forms.ValidationError(
+                f'Значение "{name}" неоднозначно: {", ".join(sorted(o.name for o in matches))}. '
+                f'Укажите название с точным регистром'
+            )
+        if not matches:
+            raise forms.ValidationError(
+                f'Неизвестное значение "{name}". Допустимые: {", ".join(sorted(choices))}'
+            )
+        return matches[0]
+
+    def clean_transmission(self):
+        return self._lookup('transmission', self.transmissions)
+
+    def clean_category(self):
+        return self._lookup('category', self.categories)
+
+
+class CarImportUploadForm(forms.Form):
+    """Загрузка CSV-файла с автомобилями партнера"""
+    MAX_SIZE = 5 * 1024 * 1024
+
+    file = forms.FileField(
+        label='CSV-файл',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'})
+    )
+    partial = forms.BooleanField(
+        label='Импортировать строки без ошибок, даже если в файле есть ошибки',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if file.size > self.MAX_SIZE:
+            raise ValidationError('Файл больше 5 МБ, разделите его на части')
+        return file
@@ -0,0 +1,26 @@
+"""
+Изображения автомобилей для карточек каталога.
+
+annotate_image_info() добавляет к queryset автомобилей главное
+изображение (файл, миниатюры, размеры) и количество фото подзапросами,
+поэтому страница каталога стоит постоянное число запросов.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import CarImage
+
+
+def annotate_image_info(queryset):
+    """Аннотирует автомобили полями main_image_* и images_count"""
+    images = CarImage.objects.filter(car=OuterRef('pk'))
+    main_image = images.order_by('-is_main', 'order', 'created_at')
+    images_count = images.order_by().values('car').annotate(count=Count('id')).values('count')
+    return queryset.annotate(
+        main_image_name=Subquery(main_image.values('image')[:1]),
+        main_image_thumbnail=Subquery(main_image.values('thumbnail')[:1]),
+        main_image_webp=Subquery(main_image.values('thumbnail_webp')[:1]),
+        main_image_width=Subquery(main_image.values('width')[:1]),
+        main_image_height=Subquery(main_image.values('height')[:1]),
+        images_count=Coalesce(Subquery(images_count, output_field=IntegerField()), Value(0)),
+    )
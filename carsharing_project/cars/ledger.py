@@ -0,0 +1,234 @@
+"""
+Журнал партнера и баланс.
+
+Каждое изменение денег партнера - отдельная проводка PartnerLedgerEntry
+с остатком после нее (balance_after). User.balance и User.total_earned
+обновляются вместе с проводкой под блокировкой строки партнера, поэтому
+баланс читается одним полем.
+
+Проводки не редактируются: sync_bookings() и sync_payout() сравнивают
+уже проведенную по документу сумму с тем, что должно быть по его
+текущему состоянию, и проводят разницу:
+- завершенное бронирование дает доход calculated_price;
+- выплата в статусе "ожидает", "в обработке" или "выполнено" списывает
+  сумму с доступного баланса, отмена выплаты возвращает ее.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Booking, Car, PartnerLedgerEntry, PartnerPayout, User
+from .statuses import booking_statuses, BOOKING_COMPLETED
+
+HELD_PAYOUT_STATUSES = ('pending', 'processing', 'completed')
+
+ZERO = Decimal('0.00')
+
+
+def _lock_partner(partner_id):
+    return User.objects.select_for_update().only(
+        'id', 'balance', 'total_earned'
+    ).get(pk=partner_id)
+
+
+def _post(partner, entries):
+    """Проводит entries по заблокированному партнеру; entries - словари полей"""
+    if not entries:
+        return []
+    objects = []
+    for entry in entries:
+        partner.balance += entry['amount']
+        if entry['kind'] == PartnerLedgerEntry.KIND_BOOKING:
+            partner.total_earned += entry['amount']
+        objects.append(PartnerLedgerEntry(
+            partner_id=partner.pk, balance_after=partner.balance, **entry
+        ))
+    PartnerLedgerEntry.objects.bulk_create(objects)
+    partner.save(update_fields=['balance', 'total_earned'])
+    return objects
+
+
+def _posted(field, ids):
+    rows = PartnerLedgerEntry.objects.filter(**{f'{field}__in': ids}).values(field).annotate(
+        total=Sum('amount')
+    ).values_list(field, 'total')
+    return dict(rows)
+
+
+def sync_bookings(booking_ids):
+    """Проводит доход (или его сторно) по бронированиям booking_ids"""
+    completed_id = booking_statuses.id(BOOKING_COMPLETED)
+    rows = Booking.objects.filter(pk__in=booking_ids).values_list(
+        'pk', 'status_id', 'calculated_price', 'car__partner_id'
+    )
+    by_partner = defaultdict(list)
+    for row in rows:
+        by_partner[row[3]].append(row)
+
+    posted_entries = []
+    with transaction.atomic():
+        # Партнеры блокируются в одном порядке, чтобы не было взаимоблокировок
+        for partner_id in sorted(by_partner):
+            partner = _lock_partner(partner_id)
+            bookings = by_partner[partner_id]
+            posted = _posted('booking_id', [pk for pk, *rest in bookings])
+            entries = []
+            for pk, status_id, price, _ in bookings:
+                target = price if status_id == completed_id else ZERO
+                diff = target - posted.get(pk, ZERO)
+                if diff:
+                    entries.append({
+                        'kind': PartnerLedgerEntry.KIND_BOOKING,
+                        'amount': diff,
+                        'booking_id': pk,
+                        'description': f'Бронирование #{pk}' + ('' if diff > 0 else ' (сторно)'),
+                    })
+            posted_entries += _post(partner, entries)
+    return posted_entries
+
+
+def sync_payout(payout):
+    """Проводит списание (или возврат) по выплате"""
+    target = -payout.amount if payout.status in HELD_PAYOUT_STATUSES else ZERO
+    with transaction.atomic():
+        partner = _lock_partner(payout.partner_id)
+        diff = target - _posted('payout_id', [payout.pk]).get(payout.pk, ZERO)
+        if not diff:
+            return []
+        return _post(partner, [{
+            'kind': PartnerLedgerEntry.KIND_PAYOUT,
+            'amount': diff,
+            'payout_id': payout.pk,
+            'description': f'Выплата #{payout.pk}' + (' (возврат)' if diff > 0 else ''),
+        }])
+
+
+def reverse_deleted(field, pk, skip_partner=None):
+    """
+    Сторнирует проводки документа перед его удалением; field - 'booking_id'
+    или 'payout_id'. Сторно проводится без ссылки на документ: ссылки
+    его проводок удаление все равно обнулит (SET_NULL).
+    skip_partner(partner_id) -> True для партнеров, удаляемых вместе с ним.
+    """
+    rows = PartnerLedgerEntry.objects.filter(**{field: pk}).order_by().values(
+        'partner_id', 'kind'
+    ).annotate(total=Sum('amount'))
+    description = (
+        f'Бронирование #{pk} удалено' if field == 'booking_id' else f'Выплата #{pk} удалена'
+    )
+
+    posted_entries = []
+    with transaction.atomic():
+        for row in sorted(rows, key=lambda row: row['partner_id']):
+            if not row['total'] or (skip_partner and skip_partner(row['partner_id'])):
+                continue
+            partner = _lock_partner(row['partner_id'])
+            posted_entries += _post(partner, [{
+                'kind': row['kind'],
+                'amount': -row['total'],
+                'description': description,
+            }])
+    return posted_entries
+
+
+def get_balance(partner_id, lock=False):
+    """Доступный к выводу баланс; lock=True - с блокировкой до конца транзакции"""
+    if lock:
+        return _lock_partner(partner_id).balance
+    return User.objects.filter(pk=partner_id).values_list('balance', flat=True).first() or ZERO
+
+
+def _sum(queryset, group_by, field):
+    """Подзапрос суммы field по партнеру (group_by - путь к партнеру)"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    total = queryset.order_by().values(group_by).annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(total, output_field=money), Value(ZERO), output_field=money)
+
+
+def reconcile(partner_ids=None, fix=False):
+    """
+    Сверяет журнал с бронированиями и выплатами.
+    Возвращает список расхождений; при fix=True проводит недостающие
+    суммы и выравнивает User.balance/total_earned по журналу.
+    """
+    revenue = Booking.objects.filter(
+        car__partner=OuterRef('pk'),
+        status_id=booking_statuses.id(BOOKING_COMPLETED)
+    )
+    held = PartnerPayout.objects.filter(partner=OuterRef('pk'), status__in=HELD_PAYOUT_STATUSES)
+    ledger = PartnerLedgerEntry.objects.filter(partner=OuterRef('pk'))
+    ledger_earned = ledger.filter(kind=PartnerLedgerEntry.KIND_BOOKING)
+
+    # Партнер - не только is_partner: владельцы автомобилей тоже (как views.is_partner)
+    partners = User.objects.filter(
+        Q(is_partner=True)
+        | Q(pk__in=Car.objects.values('partner_id'))
+        | Q(pk__in=PartnerPayout.objects.values('partner_id'))
+        | Q(pk__in=PartnerLedgerEntry.objects.values('partner_id'))
+    )
+    if partner_ids:
+        partners = User.objects.filter(pk__in=partner_ids)
+    partners = partners.annotate(
+        expected_earned=_sum(revenue, 'car__partner', 'calculated_price'),
+        expected_held=_sum(held, 'partner', 'amount'),
+        ledger_balance=_sum(ledger, 'partner', 'amount'),
+        ledger_earned=_sum(ledger_earned, 'partner', 'amount'),
+    ).only('id', 'username', 'balance', 'total_earned')
+
+    problems = []
+    for partner in list(partners):
+        expected_balance = partner.expected_earned - partner.expected_held
+        checks = {
+            'журнал: доход': (partner.ledger_earned, partner.expected_earned),
+            'журнал: баланс': (partner.ledger_balance, expected_balance),
+            'User.total_earned': (partner.total_earned, partner.ledger_earned),
+            'User.balance': (partner.balance, partner.ledger_balance),
+        }
+        mismatches = {name: values for name, values in checks.items() if values[0] != values[1]}
+        if not mismatches:
+            continue
+        problems.append({'partner': partner, 'mismatches': mismatches})
+        if fix:
+            _repair(partner.pk)
+    return problems
+
+
+def _repair(partner_id):
+    booking_ids = set(Booking.objects.filter(
+        car__partner_id=partner_id,
+        status_id=booking_statuses.id(BOOKING_COMPLETED)
+    ).values_list('pk', flat=True))
+    booking_ids |= set(PartnerLedgerEntry.objects.filter(
+        partner_id=partner_id, booking__isnull=False
+    ).values_list('booking_id', flat=True))
+    sync_bookings(booking_ids)
+    for payout in PartnerPayout.objects.filter(partner_id=partner_id):
+        sync_payout(payout)
+
+    # Проводки удаленных документов (ссылка обнулена) должны давать ноль
+    orphans = PartnerLedgerEntry.objects.filter(partner_id=partner_id).filter(
+        Q(kind=PartnerLedgerEntry.KIND_BOOKING, booking__isnull=True)
+        | Q(kind=PartnerLedgerEntry.KIND_PAYOUT, payout__isnull=True)
+    ).order_by().values('kind').annotate(total=Sum('amount'))
+    with transaction.atomic():
+        partner = _lock_partner(partner_id)
+        _post(partner, [
+            {
+                'kind': row['kind'],
+                'amount': -row['total'],
+                'description': 'Сторно проводок удаленных документов',
+            }
+            for row in orphans if row['total']
+        ])
+
+    with transaction.atomic():
+        partner = _lock_partner(partner_id)
+        totals = PartnerLedgerEntry.objects.filter(partner_id=partner_id)
+        partner.balance = totals.aggregate(total=Sum('amount'))['total'] or ZERO
+        partner.total_earned = totals.filter(
+            kind=PartnerLedgerEntry.KIND_BOOKING
+        ).aggregate(total=Sum('amount'))['total'] or ZERO
+        partner.save(update_fields=['balance', 'total_earned'])
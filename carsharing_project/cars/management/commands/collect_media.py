@@ -0,0 +1,56 @@
+# cars/management/commands/collect_media.py
+
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from cars.storage import media_storage, reference_count
+
+
+class Command(BaseCommand):
+    help = 'Удаляет файлы фотографий, на которые не ссылается ни один автомобиль'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, не удаляя их',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд (загрузки в процессе)',
+        )
+
+    def _walk(self, directory):
+        if not media_storage.exists(directory):
+            return
+        subdirs, files = media_storage.listdir(directory)
+        for name in files:
+            yield f'{directory}/{name}'
+        for subdir in subdirs:
+            yield from self._walk(f'{directory}/{subdir}')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['min_age']
+        deleted = freed = 0
+
+        for name in self._walk('car_images'):
+            if os.path.getmtime(media_storage.path(name)) > cutoff:
+                continue
+            if reference_count(name):
+                continue
+            size = media_storage.size(name)
+            if dry_run:
+                self.stdout.write(f'Будет удален: {name} ({size} байт)')
+            else:
+                media_storage.delete(name)
+            deleted += 1
+            freed += size
+
+        verb = 'Найдено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} неиспользуемых файлов: {deleted}, {freed // 1024} КБ'
+        ))
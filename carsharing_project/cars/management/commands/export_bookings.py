@@ -0,0 +1,72 @@
+# cars/management/commands/export_bookings.py
+
+from django.core.management.base import BaseCommand, CommandError
+from carsharing_project.db_router import use_replica
+from cars.exports import (
+    EXPORTS, CSV, XLSX, DEFAULT_CHUNK_SIZE, xlsx_available, filter_queryset, iter_csv, write_xlsx
+)
+
+
+class Command(BaseCommand):
+    help = 'Выгружает бронирования (или платежи, выплаты) в CSV или XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=sorted(EXPORTS),
+            default='bookings',
+            help='Что выгружать (по умолчанию bookings)',
+        )
+        parser.add_argument('--format', choices=[CSV, XLSX], default=CSV, help='Формат файла')
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Путь к файлу; "-" - стандартный вывод (только CSV)',
+        )
+        parser.add_argument('--status', help='ID статуса (для выплат - код статуса)')
+        parser.add_argument('--date-from', help='С даты, ГГГГ-ММ-ДД')
+        parser.add_argument('--date-to', help='По дату включительно, ГГГГ-ММ-ДД')
+        parser.add_argument('--partner', type=int, help='Только данные партнера с этим ID')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Сколько строк читать из БД за раз',
+        )
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['model']]
+        fmt = options['format']
+        output = options['output']
+        if fmt == XLSX and not xlsx_available():
+            raise CommandError('Для выгрузки в XLSX установите openpyxl')
+        if fmt == XLSX and output == '-':
+            raise CommandError('Для XLSX укажите файл в --output')
+
+        try:
+            queryset = filter_queryset(
+                export,
+                export.model.objects.all(),
+                status=options['status'],
+                date_from=options['date_from'],
+                date_to=options['date_to'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+        if options['partner']:
+            queryset = queryset.filter(**{export.partner_field: options['partner']})
+
+        # Выгрузка только читает данные - с реплики, если она настроена
+        with use_replica():
+            if fmt == XLSX:
+                write_xlsx(export, queryset, output, options['chunk_size'])
+            elif output == '-':
+                for chunk in iter_csv(export, queryset, options['chunk_size'], bom=False):
+                    self.stdout.write(chunk, ending='')
+            else:
+                with open(output, 'w', encoding='utf-8', newline='') as file:
+                    for chunk in iter_csv(export, queryset, options['chunk_size']):
+                        file.write(chunk)
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f'Выгрузка сохранена в {output}'))
@@ -0,0 +1,35 @@
+# cars/management/commands/generate_thumbnails.py
+
+from django.core.management.base import BaseCommand
+from cars.models import Car, CarImage
+from cars.thumbnails import process_car, process_car_image
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие миниатюры (JPEG и WebP) для фотографий автомобилей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать миниатюры даже для уже обработанных фото',
+        )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        created = failed = 0
+
+        jobs = [
+            (process_car_image, CarImage.objects.exclude(image='').values_list('pk', flat=True)),
+            (process_car, Car.objects.exclude(image='').exclude(image__isnull=True).values_list('pk', flat=True)),
+        ]
+        for func, ids in jobs:
+            for pk in ids.iterator():
+                try:
+                    if func(pk, force=force):
+                        created += 1
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Ошибка ({func.__name__}, id={pk}): {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Создано миниатюр: {created}, ошибок: {failed}'))
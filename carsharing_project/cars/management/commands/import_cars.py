@@ -0,0 +1,85 @@
+# cars/management/commands/import_cars.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from cars.car_import import import_cars, write_error_report, DEFAULT_BATCH_SIZE
+from cars.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импортирует автомобили партнера из CSV-файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Путь к CSV-файлу')
+        parser.add_argument(
+            '--partner',
+            required=True,
+            help='ID, имя пользователя или email партнера',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Размер пакета bulk_create (по умолчанию {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--partial',
+            action='store_true',
+            help='Импортировать строки без ошибок, даже если в файле есть ошибки',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только проверить файл, ничего не записывая',
+        )
+        parser.add_argument('--report', help='Сохранить ошибки по строкам в CSV-файл')
+
+    def _get_partner(self, value):
+        partners = User.objects.filter(is_partner=True)
+        partner = None
+        if value.isdigit():
+            partner = partners.filter(pk=value).first()
+        partner = partner or partners.filter(username=value).first() or partners.filter(email=value).first()
+        if partner is None:
+            raise CommandError(f'Партнер "{value}" не найден')
+        return partner
+
+    def handle(self, *args, **options):
+        partner = self._get_partner(options['partner'])
+        started = time.monotonic()
+
+        try:
+            result = import_cars(
+                options['file'],
+                partner,
+                batch_size=options['batch_size'],
+                partial=options['partial'],
+                dry_run=options['dry_run'],
+            )
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать файл: {e}')
+        elapsed = time.monotonic() - started
+
+        for error in result.errors[:50]:
+            self.stdout.write(self.style.WARNING(f'Строка {error.line}: {"; ".join(error.messages)}'))
+        if len(result.errors) > 50:
+            self.stdout.write(f'... и еще {len(result.errors) - 50} строк с ошибками')
+
+        if options['report'] and result.errors:
+            with open(options['report'], 'w', encoding='utf-8-sig', newline='') as file:
+                write_error_report(result, file)
+            self.stdout.write(f'Отчет об ошибках: {options["report"]}')
+
+        summary = (
+            f'Строк: {result.rows}, с ошибками: {len(result.errors)}, '
+            f'добавлено автомобилей: {result.created} за {elapsed:.1f} с'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Проверка без записи. {summary}'))
+        elif result.errors and not result.created and not options['partial']:
+            self.stdout.write(self.style.ERROR(
+                f'{summary}. Ничего не записано: исправьте ошибки или запустите с --partial'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
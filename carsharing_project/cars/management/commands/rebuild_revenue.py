@@ -0,0 +1,25 @@
+# cars/management/commands/rebuild_revenue.py
+
+from django.core.management.base import BaseCommand
+from cars.revenue import rebuild_monthly_revenue
+from cars.stats import invalidate_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет доход по месяцам (MonthlyRevenue) по завершенным бронированиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Размер пакета вставки (по умолчанию 500)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываю доход по месяцам...')
+
+        rows = rebuild_monthly_revenue(batch_size=options['batch_size'])
+        invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(f'Записано строк (автомобиль x месяц): {rows}'))
@@ -0,0 +1,16 @@
+# cars/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+from cars.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс каталога автомобилей'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(f'Перестраиваю индекс ({backend.__class__.__name__})...')
+
+        count = backend.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано автомобилей: {count}'))
@@ -0,0 +1,17 @@
+# cars/management/commands/recalculate_ratings.py
+
+from django.core.management.base import BaseCommand
+from cars.ratings import recalculate_ratings
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные рейтинги автомобилей и партнеров с отзывами'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Пересчитываю рейтинги...')
+
+        fixed_cars, fixed_partners = recalculate_ratings()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено автомобилей: {fixed_cars}, партнеров: {fixed_partners}'
+        ))
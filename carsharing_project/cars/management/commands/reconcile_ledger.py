@@ -0,0 +1,41 @@
+# cars/management/commands/reconcile_ledger.py
+
+from django.core.management.base import BaseCommand
+from cars.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Сверяет журнал партнеров и балансы с бронированиями и выплатами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partner',
+            type=int,
+            action='append',
+            help='ID партнера (можно указать несколько раз); по умолчанию - все партнеры',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Провести недостающие суммы и выровнять балансы',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Сверяю журнал партнеров...')
+
+        problems = reconcile(options['partner'], fix=options['fix'])
+
+        for problem in problems:
+            partner = problem['partner']
+            self.stdout.write(self.style.WARNING(f'Партнер #{partner.pk} ({partner.username}):'))
+            for name, (actual, expected) in problem['mismatches'].items():
+                self.stdout.write(f'  {name}: {actual}, ожидается {expected}')
+
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Исправлено партнеров: {len(problems)}'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождения у {len(problems)} партнеров, запустите с --fix'
+            ))
@@ -0,0 +1,18 @@
+# cars/management/commands/refresh_availability.py
+
+from django.core.management.base import BaseCommand
+from cars.availability import refresh_available_now
+from cars.stats import invalidate_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает флаг "доступен сейчас" для всех автомобилей по их бронированиям'
+
+    def handle(self, *args, **options):
+        freed, taken = refresh_available_now()
+        if freed or taken:
+            invalidate_dashboard_stats()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Освобождено автомобилей: {freed}, отмечено занятыми: {taken}'
+        ))
@@ -0,0 +1,79 @@
+# cars/management/commands/requote_bookings.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cars.models import Booking, Payment
+from cars.pricing import quote
+from cars.statuses import (
+    booking_statuses, payment_types, payment_statuses,
+    BOOKING_CONFIRMED, BOOKING_ACTIVE, PAYMENT_PREPAYMENT, PAYMENT_PENDING
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает стоимость открытых бронирований по текущим тарифам автомобилей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--car',
+            type=int,
+            action='append',
+            help='ID автомобиля (можно указать несколько раз); по умолчанию - все',
+        )
+        parser.add_argument(
+            '--include-active',
+            action='store_true',
+            help='Пересчитать и уже начавшиеся аренды',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать изменения',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [BOOKING_CONFIRMED]
+        if options['include_active']:
+            statuses.append(BOOKING_ACTIVE)
+
+        bookings = Booking.objects.filter(
+            status_id__in=booking_statuses.ids(statuses)
+        ).select_related('car').only(
+            'id', 'start_date', 'end_date', 'calculated_price',
+            'car__price_per_hour', 'car__price_per_day'
+        )
+        if options['car']:
+            bookings = bookings.filter(car_id__in=options['car'])
+
+        changed = []
+        quotes = {}
+        for booking in bookings.iterator():
+            new_price = quote(booking.car, booking.start_date, booking.end_date)
+            if new_price.amount != booking.calculated_price:
+                self.stdout.write(
+                    f'Бронирование #{booking.id}: {booking.calculated_price} -> {new_price.amount} руб.'
+                )
+                booking.calculated_price = new_price.amount
+                changed.append(booking)
+                quotes[booking.pk] = new_price
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Будет пересчитано бронирований: {len(changed)}'))
+            return
+
+        # Ожидающая оплаты предоплата пересчитывается вместе с ценой
+        payments = list(Payment.objects.filter(
+            booking_id__in=list(quotes),
+            payment_type_id=payment_types.id(PAYMENT_PREPAYMENT),
+            status_id=payment_statuses.id(PAYMENT_PENDING)
+        ).only('id', 'booking_id', 'amount'))
+        for payment in payments:
+            payment.amount = quotes[payment.booking_id].prepayment
+
+        with transaction.atomic():
+            Booking.objects.bulk_update(changed, ['calculated_price'], batch_size=500)
+            Payment.objects.bulk_update(payments, ['amount'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано бронирований: {len(changed)}, предоплат: {len(payments)}'
+        ))
@@ -0,0 +1,70 @@
+# cars/management/commands/run_scheduler.py
+
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from cars.scheduler import (
+    BookingScheduler, ACTIVATE,
+    DEFAULT_HORIZON, DEFAULT_RELOAD_INTERVAL, DEFAULT_BATCH_SIZE
+)
+
+
+class Command(BaseCommand):
+    help = 'Запускает планировщик: бронирования становятся активными и завершаются точно в срок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon',
+            type=int,
+            default=DEFAULT_HORIZON,
+            help='На сколько секунд вперед загружать сроки в память',
+        )
+        parser.add_argument(
+            '--reload-interval',
+            type=int,
+            default=DEFAULT_RELOAD_INTERVAL,
+            help='Как часто (в секундах) перечитывать расписание из БД',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Максимум бронирований в одном UPDATE',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить просроченные переходы и завершиться',
+        )
+
+    def _report(self, kind, requested, done):
+        action = 'активировано' if kind == ACTIVATE else 'завершено'
+        self.stdout.write(f'Бронирований {action}: {done} из {requested}')
+
+    def handle(self, *args, **options):
+        scheduler = BookingScheduler(
+            horizon=options['horizon'],
+            reload_interval=options['reload_interval'],
+            batch_size=options['batch_size'],
+            on_batch=self._report,
+        )
+
+        if options['once']:
+            scheduler.load()
+            processed = scheduler.run_pending()
+            self.stdout.write(self.style.SUCCESS(f'Выполнено переходов: {processed}'))
+            return
+
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('Останавливаю планировщик...')
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(self.style.SUCCESS('Планировщик бронирований запущен'))
+        scheduler.run(stop_event)
+        self.stdout.write(self.style.SUCCESS('Планировщик остановлен'))
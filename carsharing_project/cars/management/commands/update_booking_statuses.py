@@ -1,42 +1,63 @@
 # cars/management/commands/update_booking_statuses.py
 
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from cars.models import Booking, BookingStatus, CarStatus
+from cars.booking import complete_expired_bookings
 
 
 class Command(BaseCommand):
     help = 'Обновляет статусы бронирований: активные становятся завершенными'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать бронирования, ничего не меняя',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество бронирований в одной транзакции',
+        )
+        parser.add_argument(
+            '--time-limit',
+            type=float,
+            default=None,
+            help='Не начинать новые пакеты после указанного числа секунд',
+        )
+
+    def _progress(self, stats):
+        rate = stats['bookings'] / stats['elapsed'] if stats['elapsed'] else 0
+        self.stdout.write(
+            f"Пакет {stats['batches']}: завершено {stats['bookings']} бронирований, "
+            f"освобождено {stats['cars']} автомобилей ({rate:.0f} в секунду)"
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Начинаю обновление статусов бронирований...')
 
         try:
-            # Получаем статусы
-            completed_status = BookingStatus.objects.get(name='завершено')
-            active_status = BookingStatus.objects.get(name='активно')
-            available_status = CarStatus.objects.get(name='доступен')
-
-            # Находим все активные бронирования, у которых дата окончания прошла
-            expired_bookings = Booking.objects.filter(
-                status=active_status,
-                end_date__lt=timezone.now()
+            stats = complete_expired_bookings(
+                batch_size=options['batch_size'],
+                time_limit=options['time_limit'],
+                dry_run=options['dry_run'],
+                on_batch=self._progress,
             )
-
-            count = expired_bookings.count()
-            for booking in expired_bookings:
-                # Меняем статус бронирования на завершено
-                booking.status = completed_status
-                booking.save()
-
-                # Меняем статус автомобиля на доступен
-                car = booking.car
-                car.status = available_status
-                car.save()
-
-                self.stdout.write(f'Бронирование #{booking.id} завершено')
-
-            self.stdout.write(self.style.SUCCESS(f'Успешно завершено {count} бронирований'))
-
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Ошибка: {str(e)}'))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'Ошибка: {str(e)}'))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Будет завершено {stats['bookings']} бронирований "
+                f"({stats['cars']} автомобилей)"
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Успешно завершено {stats['bookings']} бронирований за {stats['elapsed']:.1f} с"
+        ))
+        if not stats['finished']:
+            self.stdout.write(self.style.WARNING(
+                'Достигнут лимит времени, оставшиеся бронирования будут обработаны при следующем запуске'
+            ))
@@ -4,6 +4,8 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 import os
 
+from .storage import media_storage
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, username, password=None, **extra_fields):
         if not email:
@@ -64,6 +66,21 @@ class User(AbstractUser):
         blank=True,
         verbose_name='Банковские реквизиты'
     )
+    # Рейтинг партнера (поддерживается cars.ratings при изменении отзывов)
+    partner_rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        verbose_name='Рейтинг партнера'
+    )
+    partner_rating_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Оценок партнера'
+    )
+    partner_rating_sum = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Сумма оценок партнера'
+    )
 
     def __str__(self):
         return f"{self.email} ({self.get_role_display()})"
@@ -116,6 +133,19 @@ def car_image_upload_path(instance, filename):
     # Возвращаем путь: cars/<car_id>/images/<filename>
     return os.path.join('cars', str(instance.car.id), 'images', filename)
 
+def image_info(name, thumbnail_name=None, webp_name=None, width=None, height=None):
+    """Словарь с URL изображения, его миниатюр и размерами"""
+    storage = CarImage._meta.get_field('image').storage
+    url = storage.url(name)
+    return {
+        'url': url,
+        'thumbnail_url': storage.url(thumbnail_name) if thumbnail_name else url,
+        'webp_url': storage.url(webp_name) if webp_name else None,
+        'width': width,
+        'height': height,
+    }
+
+
 class Car(models.Model):
     brand = models.CharField(max_length=100)
     model = models.CharField(max_length=100)
@@ -127,52 +157,90 @@ class Car(models.Model):
     price_per_day = models.DecimalField(max_digits=10, decimal_places=2)
     mileage_limit = models.IntegerField(null=True, blank=True)
     status = models.ForeignKey(CarStatus, on_delete=models.PROTECT, default=1)
+    # Свободен ли автомобиль в текущий момент (пересчитывается cars.availability)
+    available_now = models.BooleanField(default=True, db_index=True, editable=False,
+                                        verbose_name='Доступен сейчас')
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
     address = models.CharField(max_length=255, blank=True)
     partner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cars')
     category = models.ForeignKey(CarCategory, on_delete=models.SET_NULL, null=True, blank=True)
-    image = models.ImageField(upload_to='car_images/', blank=True)
+    image = models.ImageField(upload_to='car_images/', blank=True, storage=media_storage,
+                              width_field='image_width', height_field='image_height')
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Уменьшенные копии (создаются cars.thumbnails в фоне)
+    image_thumbnail = models.ImageField(upload_to='car_images/thumbnails/', blank=True,
+                                        editable=False, storage=media_storage)
+    image_thumbnail_webp = models.ImageField(upload_to='car_images/thumbnails/', blank=True,
+                                             editable=False, storage=media_storage)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     role = models.CharField(max_length=20, default='client', blank=True)
+    # Рейтинг по опубликованным отзывам (поддерживается cars.ratings)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, verbose_name='Рейтинг')
+    rating_count = models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.year})"
 
     @property
     def is_available(self):
-        return self.status.name == 'доступен'
+        return self.available_now
 
-    def get_main_image(self):
+    def _images_prefetched(self):
+        return 'images' in getattr(self, '_prefetched_objects_cache', {})
+
+    def get_main_image_info(self):
+        """
+        Главное изображение: словарь с url оригинала, thumbnail_url,
+        webp_url и размерами оригинала, либо None если фото нет.
+        """
         if self.image:
-            return self.image.url
-        # Проверяем связанные изображения
-        main_image = self.images.filter(is_main=True).first()
-        if main_image:
-            return main_image.image.url
-        first_image = self.images.first()
-        if first_image:
-            return first_image.image.url
-        return '/static/images/no-image.png'
+            return image_info(self.image.name, self.image_thumbnail.name,
+                              self.image_thumbnail_webp.name, self.image_width, self.image_height)
+        # Аннотация из cars.images.annotate_image_info - без запросов
+        if hasattr(self, 'main_image_name'):
+            if not self.main_image_name:
+                return None
+            return image_info(self.main_image_name, self.main_image_thumbnail, self.main_image_webp,
+                              self.main_image_width, self.main_image_height)
+        # Из prefetch_related('images') или одним запросом
+        images = list(self.images.all())
+        main_image = next((img for img in images if img.is_main), None)
+        if main_image is None and images:
+            main_image = images[0]
+        return main_image.get_info() if main_image else None
+
+    def get_main_image_url(self):
+        """URL главного изображения или None"""
+        info = self.get_main_image_info()
+        return info['url'] if info else None
+
+    def get_main_image(self):
+        return self.get_main_image_url() or '/static/images/no-image.png'
 
     def get_all_images(self):
+        if self._images_prefetched():
+            return self.images.all()
         return self.images.all().order_by('order', 'created_at')
 
     def get_images_count(self):
         """Возвращает количество изображений"""
+        if hasattr(self, 'images_count'):
+            return self.images_count
+        if self._images_prefetched():
+            return len(self.images.all())
         return self.images.count()
 
     def get_average_rating(self):
         """Средняя оценка автомобиля"""
-        reviews = self.reviews.filter(is_published=True)
-        if reviews:
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0
+        return round(float(self.rating_avg), 1)
 
     def get_reviews_count(self):
         """Количество отзывов"""
-        return self.reviews.filter(is_published=True).count()
+        return self.rating_count
 
     def get_reviews(self):
         """Все опубликованные отзывы"""
@@ -205,8 +273,37 @@ class CarImage(models.Model):
     )
     image = models.ImageField(
         upload_to='car_images/',
+        storage=media_storage,
+        width_field='width',
+        height_field='height',
         verbose_name="Изображение"
     )
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Ширина"
+    )
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Высота"
+    )
+    thumbnail = models.ImageField(
+        upload_to='car_images/thumbnails/',
+        storage=media_storage,
+        blank=True,
+        editable=False,
+        verbose_name="Миниатюра"
+    )
+    thumbnail_webp = models.ImageField(
+        upload_to='car_images/thumbnails/',
+        storage=media_storage,
+        blank=True,
+        editable=False,
+        verbose_name="Миниатюра WebP"
+    )
     is_main = models.BooleanField(
         default=False,
         verbose_name="Главное изображение"
@@ -233,6 +330,19 @@ class CarImage(models.Model):
     def __str__(self):
         return f"Изображение для {self.car.brand} {self.car.model}"
 
+    def get_info(self):
+        return image_info(self.image.name, self.thumbnail.name, self.thumbnail_webp.name,
+                          self.width, self.height)
+
+    @property
+    def thumbnail_url(self):
+        """URL миниатюры (оригинал, пока миниатюра не создана)"""
+        return self.thumbnail.url if self.thumbnail else self.image.url
+
+    @property
+    def webp_url(self):
+        return self.thumbnail_webp.url if self.thumbnail_webp else None
+
 
 class BookingStatus(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -254,6 +364,16 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Проверка пересечений бронирований автомобиля
+            models.Index(fields=['car', 'status', 'start_date', 'end_date'],
+                         name='booking_car_status_period_idx'),
+            # Поиск начавшихся и завершившихся бронирований (планировщик)
+            models.Index(fields=['status', 'start_date'], name='booking_status_start_idx'),
+            models.Index(fields=['status', 'end_date'], name='booking_status_end_idx'),
+        ]
+
     def __str__(self):
         return f"Бронирование #{self.id} - {self.car} от {self.client}"
 
@@ -513,4 +633,115 @@ class PartnerPayout(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f'Выплата #{self.id} - {self.partner.username} - {self.amount}₽'
\ No newline at end of file
+        return f'Выплата #{self.id} - {self.partner.username} - {self.amount}₽'
+
+class PartnerLedgerEntry(models.Model):
+    """Проводка в журнале партнера (только добавление)"""
+    KIND_BOOKING = 'booking'
+    KIND_PAYOUT = 'payout'
+    KIND_ADJUSTMENT = 'adjustment'
+
+    partner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='ledger_entries',
+        verbose_name='Партнер'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            (KIND_BOOKING, 'Доход от аренды'),
+            (KIND_PAYOUT, 'Выплата'),
+            (KIND_ADJUSTMENT, 'Корректировка'),
+        ],
+        verbose_name='Тип'
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Сумма'
+    )
+    balance_after = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Баланс после проводки'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name='Бронирование'
+    )
+    payout = models.ForeignKey(
+        PartnerPayout,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+        verbose_name='Выплата'
+    )
+    description = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Описание'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата'
+    )
+
+    class Meta:
+        verbose_name = 'Проводка партнера'
+        verbose_name_plural = 'Журнал партнеров'
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['partner', '-id'], name='ledger_partner_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.amount}₽ ({self.partner.username})'
+
+
+class MonthlyRevenue(models.Model):
+    """Доход автомобиля за месяц по завершенным бронированиям (cars.revenue)"""
+    partner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='monthly_revenue',
+        verbose_name='Партнер'
+    )
+    car = models.ForeignKey(
+        Car,
+        on_delete=models.CASCADE,
+        related_name='monthly_revenue',
+        verbose_name='Автомобиль'
+    )
+    month = models.DateField(verbose_name='Месяц')
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Доход'
+    )
+    bookings_count = models.IntegerField(default=0, verbose_name='Бронирований')
+    minutes = models.IntegerField(default=0, verbose_name='Минут аренды')
+
+    class Meta:
+        verbose_name = 'Доход за месяц'
+        verbose_name_plural = 'Доход по месяцам'
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['car', 'month'], name='monthly_revenue_car_month'),
+        ]
+        indexes = [
+            models.Index(fields=['partner', 'month'], name='monthly_revenue_partner_idx'),
+        ]
+
+    @property
+    def hours(self):
+        return self.minutes / 60
+
+    def __str__(self):
+        return f'{self.car} за {self.month:%m.%Y}: {self.revenue}₽'
@@ -0,0 +1,193 @@
+"""
+Постраничный вывод списков по ключу (keyset pagination).
+
+Вместо OFFSET следующая страница выбирается условием по значениям
+полей сортировки последней записи: (created_at, id) < (x, y). Поэтому
+дальние страницы стоят столько же, сколько первая. Позиция передается
+в непрозрачном курсоре ?cursor=.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connection
+from django.db.models import Q
+
+PER_PAGE = 20
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, [_encode_value(v) for v in values]])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (направление, значения) или None для неверного курсора"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def _cursor_values(model, fields, values):
+    """
+    Значения курсора в типах полей сортировки или None, если курсор
+    подделан. Аннотации (ранг поиска) - только числа.
+    """
+    result = []
+    for (name, descending), value in zip(fields, values):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return None
+            result.append(value)
+            continue
+        try:
+            value = field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if value is None:
+            return None
+        result.append(value)
+    return result
+
+
+def _parse_ordering(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def _keyset_filter(fields, values, forward):
+    """
+    Условие "строго после values" для сортировки fields.
+    Для (a, b): a > x OR (a = x AND b > y), с учетом направления каждого поля.
+    """
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(fields, values):
+        lookup = 'lt' if descending == forward else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def approximate_count(queryset):
+    """
+    Количество строк queryset. Для неотфильтрованной таблицы в PostgreSQL
+    берется оценка планировщика из pg_class, в остальных случаях - COUNT(*).
+    """
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return queryset.count()
+
+
+class KeysetPage:
+    """Страница результатов с курсорами на соседние страницы"""
+
+    def __init__(self, items, next_cursor, previous_cursor, total=None):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def keyset_paginate(queryset, cursor=None, ordering=DEFAULT_ORDERING,
+                    per_page=PER_PAGE, with_total=False):
+    """
+    Возвращает KeysetPage для queryset, упорядоченного по ordering.
+    Последнее поле ordering должно быть уникальным (обычно id).
+    """
+    fields = _parse_ordering(ordering)
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded:
+        values = None
+        if len(decoded[1]) == len(fields):
+            values = _cursor_values(queryset.model, fields, decoded[1])
+        # Неверный курсор - первая страница
+        decoded = (decoded[0], values) if values is not None else None
+
+    forward = decoded is None or decoded[0] == 'next'
+    if forward:
+        qs = queryset.order_by(*ordering)
+    else:
+        qs = queryset.order_by(*[
+            name if descending else f'-{name}' for name, descending in fields
+        ])
+    if decoded:
+        qs = qs.filter(_keyset_filter(fields, decoded[1], forward))
+
+    items = list(qs[:per_page + 1])
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if not forward:
+        items.reverse()
+
+    def key(obj):
+        return [getattr(obj, name) for name, descending in fields]
+
+    next_cursor = previous_cursor = None
+    if items:
+        if has_more or not forward:
+            next_cursor = encode_cursor('next', key(items[-1]))
+        if decoded and (forward or has_more):
+            previous_cursor = encode_cursor('prev', key(items[0]))
+
+    total = approximate_count(queryset) if with_total else None
+    return KeysetPage(items, next_cursor, previous_cursor, total)
+
+
+def paginate(request, queryset, ordering=DEFAULT_ORDERING, per_page=PER_PAGE, with_total=False):
+    """
+    Страница queryset по параметру ?cursor= и строка остальных
+    GET-параметров для ссылок пагинации.
+    """
+    page_obj = keyset_paginate(
+        queryset, request.GET.get('cursor'), ordering, per_page, with_total
+    )
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    params.pop('page', None)
+    return page_obj, params.urlencode()
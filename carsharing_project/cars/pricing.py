@@ -0,0 +1,127 @@
+"""
+Расчет стоимости аренды.
+
+Единственная реализация тарифа для бронирования, проверки доступности,
+каталога и пересчета бронирований. Все суммы считаются в целых копейках,
+длительность - в целых минутах (неполная минута округляется вверх),
+поэтому результат не зависит от погрешностей float.
+
+Тарифные ступени (TIERS): до суток включительно - почасовая ставка,
+дольше - посуточная, пропорционально длительности.
+
+quote_many() считает цены сразу для многих автомобилей и интервалов;
+при установленном NumPy - векторно.
+"""
+import math
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен
+    np = None
+
+MINOR_UNITS = 100
+MINUTES_PER_HOUR = 60
+MINUTES_PER_DAY = 24 * MINUTES_PER_HOUR
+
+# (максимальная длительность в минутах или None, поле ставки, минут в единице ставки)
+TIERS = [
+    (MINUTES_PER_DAY, 'price_per_hour', MINUTES_PER_HOUR),
+    (None, 'price_per_day', MINUTES_PER_DAY),
+]
+
+# Предоплата при бронировании, процентов
+PREPAYMENT_PERCENT = 30
+
+
+def to_minor(amount):
+    """Decimal рубли -> целые копейки"""
+    return int((Decimal(amount) * MINOR_UNITS).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    """Целые копейки -> Decimal рубли с двумя знаками"""
+    return (Decimal(int(minor)) / MINOR_UNITS).quantize(Decimal('0.01'))
+
+
+def duration_minutes(start_date, end_date):
+    return max(math.ceil((end_date - start_date).total_seconds() / 60), 0)
+
+
+def _tier_index(minutes):
+    for index, (limit, rate_field, unit) in enumerate(TIERS):
+        if limit is None or minutes <= limit:
+            return index
+
+
+def _divide_half_up(numerator, denominator):
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def price_minor(rates, minutes):
+    """Стоимость в копейках; rates - {поле ставки: ставка в копейках}"""
+    limit, rate_field, unit = TIERS[_tier_index(minutes)]
+    return _divide_half_up(rates[rate_field] * minutes, unit)
+
+
+def car_rates(car):
+    """Ставки автомобиля в копейках (car - модель или словарь values())"""
+    get = car.get if isinstance(car, dict) else lambda field: getattr(car, field)
+    return {rate_field: to_minor(get(rate_field)) for limit, rate_field, unit in TIERS}
+
+
+def prepayment_minor(total_minor):
+    return _divide_half_up(total_minor * PREPAYMENT_PERCENT, 100)
+
+
+class Quote:
+    """Стоимость аренды автомобиля за интервал"""
+
+    def __init__(self, minor, minutes):
+        self.minor = minor
+        self.minutes = minutes
+
+    @property
+    def amount(self):
+        return from_minor(self.minor)
+
+    @property
+    def hours(self):
+        return self.minutes / MINUTES_PER_HOUR
+
+    @property
+    def prepayment(self):
+        return from_minor(prepayment_minor(self.minor))
+
+    def __repr__(self):
+        return f'<Quote {self.amount} за {self.minutes} мин>'
+
+
+def quote(car, start_date, end_date):
+    """Стоимость аренды car на интервал [start_date, end_date)"""
+    minutes = duration_minutes(start_date, end_date)
+    return Quote(price_minor(car_rates(car), minutes), minutes)
+
+
+def quote_many(cars, windows):
+    """
+    Матрица стоимостей в копейках: result[i][j] - автомобиль cars[i]
+    на интервал windows[j] = (start_date, end_date).
+    """
+    rates = [car_rates(car) for car in cars]
+    minutes = [duration_minutes(start, end) for start, end in windows]
+    if not rates or not minutes:
+        return [[] for _ in rates]
+
+    if np is None:
+        return [[price_minor(car, m) for m in minutes] for car in rates]
+
+    # Векторный расчет: ставки (N, 1) x длительности (1, M)
+    duration = np.array(minutes, dtype=np.int64)[np.newaxis, :]
+    tier = np.array([_tier_index(m) for m in minutes])[np.newaxis, :]
+    result = np.zeros((len(rates), len(minutes)), dtype=np.int64)
+    for index, (limit, rate_field, unit) in enumerate(TIERS):
+        rate = np.array([car[rate_field] for car in rates], dtype=np.int64)[:, np.newaxis]
+        tier_price = (2 * rate * duration + unit) // (2 * unit)
+        result = np.where(tier == index, tier_price, result)
+    return result.tolist()
@@ -0,0 +1,100 @@
+"""
+Кеш ответов check_availability.
+
+Пока пользователь двигает даты на странице бронирования, один и тот же
+запрос (автомобиль, начало, конец) приходит много раз. Ответ кешируется
+на QUOTE_CACHE_TIMEOUT секунд; в ключ входят поколение бронирований
+автомобиля (cars.availability) и поколение его тарифа, поэтому новое
+бронирование или изменение цены сразу делает старые ответы недоступными.
+
+Одинаковые запросы, пришедшие одновременно, объединяются: считает
+первый, остальные ждут его результат.
+"""
+import threading
+from concurrent.futures import Future
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .availability import GENERATION_KEY as BOOKINGS_GENERATION_KEY, is_car_available
+from .models import Car
+from .pricing import quote
+
+QUOTE_CACHE_TIMEOUT = 30
+
+_PRICE_GENERATION_KEY = 'quotes:generation:{car_id}'
+_QUOTE_KEY = 'quotes:{car_id}:{bookings}:{prices}:{start}:{end}'
+
+_inflight_lock = threading.Lock()
+_inflight = {}
+
+
+def invalidate_quotes(car_id):
+    """Сбрасывает кешированные ответы после изменения тарифа автомобиля"""
+    key = _PRICE_GENERATION_KEY.format(car_id=car_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _quote_key(car_id, start_date, end_date):
+    bookings_key = BOOKINGS_GENERATION_KEY.format(car_id=car_id)
+    prices_key = _PRICE_GENERATION_KEY.format(car_id=car_id)
+    generations = cache.get_many([bookings_key, prices_key])
+    return _QUOTE_KEY.format(
+        car_id=car_id,
+        bookings=generations.get(bookings_key, 0),
+        prices=generations.get(prices_key, 0),
+        start=start_date.isoformat(),
+        end=end_date.isoformat(),
+    )
+
+
+def _compute(car_id, start_date, end_date):
+    car = Car.objects.only('id', 'price_per_hour', 'price_per_day').filter(pk=car_id).first()
+    if car is None:
+        return None
+    price = quote(car, start_date, end_date)
+    return {
+        'available': is_car_available(car_id, start_date, end_date),
+        'price': price.amount,
+        'duration_hours': round(price.hours, 1),
+    }
+
+
+def get_quote(car_id, start_date, end_date):
+    """
+    Ответ для check_availability: {'available', 'price', 'duration_hours'}
+    или None, если автомобиля нет.
+    """
+    if timezone.is_naive(start_date):
+        start_date = timezone.make_aware(start_date)
+    if timezone.is_naive(end_date):
+        end_date = timezone.make_aware(end_date)
+    key = _quote_key(car_id, start_date, end_date)
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = _compute(car_id, start_date, end_date)
+        if result is not None:
+            cache.set(key, result, QUOTE_CACHE_TIMEOUT)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
@@ -0,0 +1,114 @@
+"""
+Денормализованные рейтинги автомобилей и партнеров.
+
+Car.rating_* и User.partner_rating_* хранят сумму и количество оценок
+опубликованных отзывов. При создании, изменении, снятии с публикации
+или удалении отзыва к ним применяется разница между старым и новым
+состоянием отзыва, так что чтение рейтинга не требует запросов.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Car, User
+
+
+def review_contribution(is_published, rating, partner_rating):
+    """Вклад отзыва: (оценка автомобиля, оценка партнера) или None"""
+    if not is_published:
+        return None, None
+    return rating, partner_rating
+
+
+def review_state(review):
+    return review_contribution(review.is_published, review.rating, review.partner_rating)
+
+
+def _average(total, count):
+    if not count:
+        return Decimal('0')
+    return (Decimal(total) / count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _delta(old, new):
+    """Изменение (суммы, количества) при переходе оценки old -> new"""
+    sum_delta = (new or 0) - (old or 0)
+    count_delta = (new is not None) - (old is not None)
+    return sum_delta, count_delta
+
+
+def apply_review_change(car_id, old_state, new_state):
+    """Применяет изменение отзыва к рейтингам автомобиля и его партнера"""
+    car_delta = _delta(old_state[0], new_state[0])
+    partner_delta = _delta(old_state[1], new_state[1])
+    if car_delta == (0, 0) and partner_delta == (0, 0):
+        return
+
+    with transaction.atomic():
+        car = Car.objects.select_for_update().only(
+            'id', 'partner_id', 'rating_sum', 'rating_count'
+        ).get(pk=car_id)
+        if car_delta != (0, 0):
+            car.rating_sum += car_delta[0]
+            car.rating_count += car_delta[1]
+            car.rating_avg = _average(car.rating_sum, car.rating_count)
+            car.save(update_fields=['rating_sum', 'rating_count', 'rating_avg'])
+
+        if partner_delta != (0, 0):
+            partner = User.objects.select_for_update().only(
+                'id', 'partner_rating_sum', 'partner_rating_count'
+            ).get(pk=car.partner_id)
+            partner.partner_rating_sum += partner_delta[0]
+            partner.partner_rating_count += partner_delta[1]
+            partner.partner_rating_avg = _average(partner.partner_rating_sum, partner.partner_rating_count)
+            partner.save(update_fields=[
+                'partner_rating_sum', 'partner_rating_count', 'partner_rating_avg'
+            ])
+
+
+def recalculate_ratings():
+    """
+    Пересчитывает все рейтинги по таблице отзывов.
+    Возвращает количество исправленных автомобилей и партнеров.
+    """
+    car_rows = Car.objects.annotate(
+        real_sum=Sum('bookings__review__rating', filter=Q(bookings__review__is_published=True)),
+        real_count=Count('bookings__review', filter=Q(bookings__review__is_published=True)),
+    ).only('id', 'rating_sum', 'rating_count', 'rating_avg')
+
+    fixed_cars = []
+    for car in car_rows.iterator():
+        real_sum = car.real_sum or 0
+        real_avg = _average(real_sum, car.real_count)
+        if (car.rating_sum, car.rating_count, car.rating_avg) != (real_sum, car.real_count, real_avg):
+            car.rating_sum, car.rating_count, car.rating_avg = real_sum, car.real_count, real_avg
+            fixed_cars.append(car)
+    Car.objects.bulk_update(fixed_cars, ['rating_sum', 'rating_count', 'rating_avg'], batch_size=500)
+
+    partner_filter = Q(
+        cars__bookings__review__is_published=True,
+        cars__bookings__review__partner_rating__isnull=False
+    )
+    partner_rows = User.objects.annotate(
+        real_sum=Sum('cars__bookings__review__partner_rating', filter=partner_filter),
+        real_count=Count('cars__bookings__review', filter=partner_filter),
+    ).only('id', 'partner_rating_sum', 'partner_rating_count', 'partner_rating_avg')
+
+    fixed_partners = []
+    for partner in partner_rows.iterator():
+        real_sum = partner.real_sum or 0
+        real_avg = _average(real_sum, partner.real_count)
+        current = (partner.partner_rating_sum, partner.partner_rating_count, partner.partner_rating_avg)
+        if current != (real_sum, partner.real_count, real_avg):
+            partner.partner_rating_sum = real_sum
+            partner.partner_rating_count = partner.real_count
+            partner.partner_rating_avg = real_avg
+            fixed_partners.append(partner)
+    User.objects.bulk_update(
+        fixed_partners,
+        ['partner_rating_sum', 'partner_rating_count', 'partner_rating_avg'],
+        batch_size=500
+    )
+
+    return len(fixed_cars), len(fixed_partners)
@@ -0,0 +1,142 @@
+"""
+Доход партнеров по месяцам.
+
+MonthlyRevenue хранит для каждого автомобиля и месяца окончания аренды
+сумму, количество и длительность завершенных бронирований. Как и
+рейтинги (cars.ratings), таблица ведется разницей между старым и новым
+состоянием бронирования: завершение добавляет его вклад, отмена
+завершения или удаление - вычитает. Поэтому финансовые страницы и
+дашборды читают десятки строк вместо всей истории бронирований.
+
+Месяц определяется по end_date в текущем часовом поясе (как TruncMonth).
+rebuild_monthly_revenue() пересчитывает таблицу заново по Booking
+(команда rebuild_revenue).
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Booking, Car, MonthlyRevenue
+from .pricing import duration_minutes
+from .statuses import booking_statuses, BOOKING_COMPLETED
+
+
+def month_of(moment):
+    """Первое число месяца, на который приходится moment"""
+    return timezone.localtime(moment).date().replace(day=1)
+
+
+def booking_contribution(status_id, car_id, start_date, end_date, price):
+    """Вклад бронирования: ((car_id, месяц), сумма, минуты) или None"""
+    if status_id != booking_statuses.id(BOOKING_COMPLETED):
+        return None
+    return (car_id, month_of(end_date)), price, duration_minutes(start_date, end_date)
+
+
+def booking_state(booking):
+    return booking_contribution(
+        booking.status_id, booking.car_id, booking.start_date,
+        booking.end_date, booking.calculated_price
+    )
+
+
+def apply_booking_changes(changes):
+    """
+    Применяет изменения бронирований; changes - пары (старый вклад,
+    новый вклад). Вызывается в транзакции изменения бронирований.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for old, new in changes:
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            bucket, price, minutes = state
+            deltas[bucket][0] += sign * price
+            deltas[bucket][1] += sign
+            deltas[bucket][2] += sign * minutes
+
+    with transaction.atomic():
+        for (car_id, month), (revenue, count, minutes) in sorted(deltas.items()):
+            if (revenue, count, minutes) != (0, 0, 0):
+                _apply_delta(car_id, month, revenue, count, minutes)
+
+
+def _apply_delta(car_id, month, revenue, count, minutes):
+    rows = MonthlyRevenue.objects.filter(car_id=car_id, month=month)
+    changes = {
+        'revenue': F('revenue') + revenue,
+        'bookings_count': F('bookings_count') + count,
+        'minutes': F('minutes') + minutes,
+    }
+    if rows.update(**changes):
+        rows.filter(bookings_count__lte=0).delete()
+        return
+    # Строки нет: вычитать не из чего (например, автомобиль удаляется
+    # каскадом вместе со своими строками)
+    if count <= 0:
+        return
+    partner_id = Car.objects.filter(pk=car_id).values_list('partner_id', flat=True).first()
+    if partner_id is None:
+        return
+    try:
+        with transaction.atomic():
+            MonthlyRevenue.objects.create(
+                partner_id=partner_id, car_id=car_id, month=month,
+                revenue=revenue, bookings_count=count, minutes=minutes
+            )
+    except IntegrityError:
+        # Строку успела создать параллельная транзакция
+        rows.update(**changes)
+
+
+def monthly_totals(queryset):
+    """Суммы queryset строк MonthlyRevenue по месяцам, новые сначала"""
+    return queryset.order_by().values('month').annotate(
+        total=Sum('revenue'),
+        count=Sum('bookings_count'),
+        minutes=Sum('minutes'),
+    ).order_by('-month')
+
+
+def revenue_for_month(queryset, month):
+    """Доход строк queryset за месяц month (date первого числа)"""
+    return queryset.filter(month=month).aggregate(total=Sum('revenue'))['total'] or 0
+
+
+def previous_month(month):
+    return (month.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+
+def rebuild_monthly_revenue(batch_size=500):
+    """
+    Пересчитывает MonthlyRevenue по всем завершенным бронированиям.
+    Возвращает количество строк.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    partners = {}
+    rows = Booking.objects.filter(
+        status_id=booking_statuses.id(BOOKING_COMPLETED)
+    ).values_list(
+        'status_id', 'car_id', 'start_date', 'end_date', 'calculated_price', 'car__partner_id'
+    )
+    for row in rows.iterator(chunk_size=2000):
+        bucket, price, minutes = booking_contribution(*row[:5])
+        totals[bucket][0] += price
+        totals[bucket][1] += 1
+        totals[bucket][2] += minutes
+        partners[bucket] = row[5]
+
+    objects = [
+        MonthlyRevenue(
+            partner_id=partners[bucket], car_id=bucket[0], month=bucket[1],
+            revenue=revenue, bookings_count=count, minutes=minutes
+        )
+        for bucket, (revenue, count, minutes) in totals.items()
+    ]
+    with transaction.atomic():
+        MonthlyRevenue.objects.all().delete()
+        MonthlyRevenue.objects.bulk_create(objects, batch_size=batch_size)
+    return len(objects)
@@ -0,0 +1,153 @@
+"""
+Планировщик переходов жизненного цикла бронирований.
+
+Держит в памяти min-кучу ближайших сроков: start_date подтвержденных
+бронирований (-> "активно") и end_date активных (-> "завершено").
+Срок выбирается из кучи и обрабатывается пакетом сразу после
+наступления, вместо периодического обхода всей таблицы.
+
+В кучу загружаются только сроки в пределах horizon секунд от текущего
+момента; окно перечитывается каждые reload_interval секунд индексным
+запросом, так что новые и измененные бронирования тоже попадают в
+расписание. Состояние хранится только в БД: после перезапуска
+просроченные переходы выполняются при первой же загрузке. При каждой
+загрузке окна также массово пересчитывается Car.available_now.
+"""
+import datetime
+import heapq
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .availability import refresh_available_now
+from .booking import activate_bookings, complete_bookings
+from .models import Booking
+from .statuses import booking_statuses, BOOKING_CONFIRMED, BOOKING_ACTIVE
+
+logger = logging.getLogger(__name__)
+
+ACTIVATE = 'activate'
+COMPLETE = 'complete'
+
+DEFAULT_HORIZON = 3600
+DEFAULT_RELOAD_INTERVAL = 60
+DEFAULT_BATCH_SIZE = 500
+
+
+class BookingScheduler:
+    """Куча (срок, ID бронирования, переход)"""
+
+    def __init__(self, horizon=DEFAULT_HORIZON, reload_interval=DEFAULT_RELOAD_INTERVAL,
+                 batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+        self.horizon = datetime.timedelta(seconds=horizon)
+        self.reload_interval = reload_interval
+        self.batch_size = batch_size
+        self.on_batch = on_batch
+        self._heap = []
+        self._queued = set()
+        self._next_reload = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, deadline, booking_id, kind):
+        entry = (deadline, booking_id, kind)
+        if entry not in self._queued:
+            self._queued.add(entry)
+            heapq.heappush(self._heap, entry)
+
+    def load(self, now=None):
+        """Добавляет в кучу все сроки до now + horizon (включая просроченные)"""
+        now = now or timezone.now()
+        until = now + self.horizon
+
+        starting = Booking.objects.filter(
+            status_id=booking_statuses.id(BOOKING_CONFIRMED), start_date__lte=until
+        ).values_list('pk', 'start_date')
+        for booking_id, start_date in starting.iterator():
+            self.push(start_date, booking_id, ACTIVATE)
+
+        ending = Booking.objects.filter(
+            status_id=booking_statuses.id(BOOKING_ACTIVE), end_date__lte=until
+        ).values_list('pk', 'end_date')
+        for booking_id, end_date in ending.iterator():
+            self.push(end_date, booking_id, COMPLETE)
+
+        refresh_available_now(now=now)
+        self._next_reload = now + datetime.timedelta(seconds=self.reload_interval)
+
+    def pop_due(self, now):
+        """Извлекает все наступившие сроки, сгруппированные по переходу"""
+        due = defaultdict(list)
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            self._queued.discard(entry)
+            due[entry[2]].append(entry[1])
+        return due
+
+    def run_pending(self, now=None):
+        """
+        Выполняет наступившие переходы пакетами по batch_size.
+        Устаревшие записи (бронирование отменено или перенесено) безопасны:
+        UPDATE проверяет статус и дату и просто не изменит строку.
+        """
+        now = now or timezone.now()
+        processed = 0
+        # Активированные бронирования добавляют в кучу свои сроки
+        # завершения; уже наступившие обрабатываются следующим проходом
+        due = self.pop_due(now)
+        while due:
+            for kind in (ACTIVATE, COMPLETE):
+                booking_ids = due.get(kind, [])
+                for i in range(0, len(booking_ids), self.batch_size):
+                    chunk = booking_ids[i:i + self.batch_size]
+                    if kind == ACTIVATE:
+                        done = activate_bookings(chunk, now)
+                        if done:
+                            self._push_completions(chunk, now)
+                    else:
+                        done = complete_bookings(chunk, now)[0]
+                    processed += done
+                    if self.on_batch:
+                        self.on_batch(kind, len(chunk), done)
+            due = self.pop_due(now)
+        return processed
+
+    def _push_completions(self, booking_ids, now):
+        """Добавляет сроки завершения активных бронирований в пределах окна"""
+        ending = Booking.objects.filter(
+            pk__in=booking_ids,
+            status_id=booking_statuses.id(BOOKING_ACTIVE),
+            end_date__lte=now + self.horizon
+        ).values_list('pk', 'end_date')
+        for booking_id, end_date in ending:
+            self.push(end_date, booking_id, COMPLETE)
+
+    def seconds_until_next(self, now):
+        """Сколько можно спать до следующего срока или перезагрузки окна"""
+        wake_at = self._next_reload
+        if self._heap and self._heap[0][0] < wake_at:
+            wake_at = self._heap[0][0]
+        return max((wake_at - now).total_seconds(), 0)
+
+    def run(self, stop_event=None):
+        """Основной цикл; завершается, когда выставлен stop_event"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                now = timezone.now()
+                if self._next_reload is None or now >= self._next_reload:
+                    self.load(now)
+                self.run_pending(now)
+                delay = self.seconds_until_next(timezone.now())
+            except Exception:
+                logger.exception('Ошибка планировщика бронирований')
+                delay = self.reload_interval
+                # После ошибки БД окно перечитывается заново
+                self._next_reload = None
+            finally:
+                close_old_connections()
+            stop_event.wait(delay)
@@ -0,0 +1,228 @@
+"""
+Полнотекстовый поиск по каталогу автомобилей.
+
+Бэкенд выбирается по типу базы данных:
+- SQLite: отдельная таблица FTS5, синхронизируемая сигналами модели Car;
+- PostgreSQL: GIN-индекс по выражению to_tsvector(...);
+- остальные БД: прежний поиск через icontains.
+
+Индекс создается после migrate (сигнал post_migrate) и перестраивается
+командой rebuild_search_index, а не при первом поиске.
+
+Все бэкенды поддерживают поиск по префиксу ("тойо" найдет "Toyota")
+и добавляют к queryset аннотацию search_rank для сортировки по релевантности.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Car
+
+SEARCH_FIELDS = ('brand', 'model', 'description', 'address')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SQLiteFTSBackend:
+    """Индекс FTS5, rowid записи совпадает с id автомобиля"""
+
+    table = 'cars_car_fts'
+    # bm25: чем меньше, тем релевантнее
+    rank_ordering = ('search_rank', 'id')
+
+    def create_index(self):
+        """Создает таблицу FTS5, если ее нет; True - таблица создана"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table]
+            )
+            if cursor.fetchone() is not None:
+                return False
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                f"{', '.join(SEARCH_FIELDS)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+        return True
+
+    def _match_query(self, text):
+        # Каждое слово - префиксный запрос, слова объединяются через AND
+        return ' '.join(f'"{token}"*' for token in _tokens(text))
+
+    def index_car(self, car):
+        self.index_cars([car])
+
+    def index_cars(self, cars):
+        """Добавляет или обновляет записи нескольких автомобилей"""
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[car.pk] for car in cars])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(SEARCH_FIELDS))})",
+                [[car.pk] + [getattr(car, field) or '' for field in SEARCH_FIELDS] for car in cars]
+            )
+
+    def remove_car(self, car_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [car_id])
+
+    def rebuild(self):
+        self.create_index()
+        columns = ', '.join(f"COALESCE({field}, '')" for field in SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) "
+                f"SELECT id, {columns} FROM {Car._meta.db_table}"
+            )
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+    def search(self, queryset, text):
+        match = self._match_query(text)
+        if not match:
+            return queryset
+        car_id = f'{connection.ops.quote_name(Car._meta.db_table)}.{connection.ops.quote_name("id")}'
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f'SELECT bm25({self.table}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s AND rowid = {car_id}',
+                [match],
+                output_field=FloatField()
+            )
+        ).filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        )
+
+
+class PostgresSearchBackend:
+    """tsvector по выражению с GIN-индексом; PostgreSQL обновляет его сам"""
+
+    config = 'russian'
+    index_name = 'cars_car_search_idx'
+    # ts_rank: чем больше, тем релевантнее
+    rank_ordering = ('-search_rank', '-id')
+
+    def _vector_sql(self):
+        table = Car._meta.db_table
+        parts = " || ' ' || ".join(f"COALESCE(\"{table}\".\"{field}\", '')" for field in SEARCH_FIELDS)
+        return f"to_tsvector('{self.config}', {parts})"
+
+    def _ts_query(self, text):
+        return ' & '.join(f'{token}:*' for token in _tokens(text))
+
+    def index_car(self, car):
+        pass
+
+    def index_cars(self, cars):
+        pass
+
+    def remove_car(self, car_id):
+        pass
+
+    def _create_sql(self):
+        table = Car._meta.db_table
+        vector = self._vector_sql().replace(f'"{table}".', '')
+        return f'CREATE INDEX IF NOT EXISTS {self.index_name} ON {table} USING GIN ({vector})'
+
+    def create_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self._create_sql())
+        return False
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+            cursor.execute(self._create_sql())
+        return Car.objects.count()
+
+    def search(self, queryset, text):
+        ts_query = self._ts_query(text)
+        if not ts_query:
+            return queryset
+        vector = self._vector_sql()
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f"ts_rank({vector}, to_tsquery('{self.config}', %s))",
+                [ts_query],
+                output_field=FloatField()
+            )
+        ).filter(
+            RawSQL(
+                f"{vector} @@ to_tsquery('{self.config}', %s)",
+                [ts_query],
+                output_field=BooleanField()
+            )
+        )
+
+
+class SimpleSearchBackend:
+    """Поиск через icontains для БД без полнотекстового индекса"""
+
+    rank_ordering = None
+
+    def index_car(self, car):
+        pass
+
+    def index_cars(self, cars):
+        pass
+
+    def remove_car(self, car_id):
+        pass
+
+    def create_index(self):
+        return False
+
+    def rebuild(self):
+        return 0
+
+    def search(self, queryset, text):
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}__icontains': text})
+        return queryset.filter(condition)
+
+
+_backends = {}
+
+
+def get_backend():
+    vendor = connection.vendor
+    if vendor not in _backends:
+        if vendor == 'sqlite':
+            _backends[vendor] = SQLiteFTSBackend()
+        elif vendor == 'postgresql':
+            _backends[vendor] = PostgresSearchBackend()
+        else:
+            _backends[vendor] = SimpleSearchBackend()
+    return _backends[vendor]
+
+
+def setup_index():
+    """
+    Создает поисковый индекс после migrate; новый индекс FTS5 сразу
+    заполняется существующими автомобилями.
+    """
+    backend = get_backend()
+    if backend.create_index():
+        backend.rebuild()
+
+
+def has_search_terms(text):
+    """Есть ли в строке слова для поиска ("!!" или пробелы - не поиск)"""
+    return bool(text and _tokens(text))
+
+
+def search_cars(queryset, text):
+    """
+    Фильтрует queryset автомобилей по поисковой строке.
+    Строка без слов (has_search_terms) не фильтрует и не добавляет search_rank.
+    """
+    if not has_search_terms(text):
+        return queryset
+    return get_backend().search(queryset, text)
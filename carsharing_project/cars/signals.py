@@ -0,0 +1,196 @@
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.dispatch import receiver
+
+from .models import (
+    Booking, Car, CarImage, CarStatus, BookingStatus, PaymentType, PaymentStatus, Review, PartnerPayout,
+    User
+)
+from . import ledger, ratings, revenue, thumbnails
+from . import availability
+from .statuses import REGISTRIES, booking_statuses, BOOKING_COMPLETED
+from .stats import invalidate_dashboard_stats
+from .quotes import invalidate_quotes
+from .search import get_backend as get_search_backend, setup_index as setup_search_index, SEARCH_FIELDS
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def booking_changed(sender, instance, **kwargs):
+    """Сбрасывает индекс доступности и статистику при изменении бронирования"""
+    car_id = instance.car_id
+
+    def refresh():
+        availability.invalidate_car(car_id)
+        availability.refresh_car_availability(car_id)
+
+    # После фиксации: иначе другой процесс может закешировать старые данные
+    transaction.on_commit(refresh)
+    invalidate_dashboard_stats()
+
+
+@receiver(pre_save, sender=Booking)
+def booking_before_save(sender, instance, **kwargs):
+    """Запоминает прежнее состояние бронирования для журнала и дохода по месяцам"""
+    instance._status_before = None
+    instance._revenue_before = None
+    old = None
+    if instance.pk:
+        old = Booking.objects.filter(pk=instance.pk).values_list(
+            'status_id', 'car_id', 'start_date', 'end_date', 'calculated_price'
+        ).first()
+    if old:
+        instance._status_before = old[0]
+        instance._revenue_before = revenue.booking_contribution(*old)
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved_ledger(sender, instance, **kwargs):
+    """Проводит доход партнера при завершении бронирования (или сторно)"""
+    completed_id = booking_statuses.id(BOOKING_COMPLETED)
+    if completed_id in (instance.status_id, getattr(instance, '_status_before', None)):
+        ledger.sync_bookings([instance.pk])
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved_revenue(sender, instance, **kwargs):
+    """Переносит изменение завершенного бронирования в доход по месяцам"""
+    old_state = getattr(instance, '_revenue_before', None)
+    new_state = revenue.booking_state(instance)
+    if old_state != new_state:
+        revenue.apply_booking_changes([(old_state, new_state)])
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted_revenue(sender, instance, **kwargs):
+    revenue.apply_booking_changes([(revenue.booking_state(instance), None)])
+
+
+@receiver(post_save, sender=PartnerPayout)
+def payout_saved(sender, instance, **kwargs):
+    """Списывает или возвращает сумму выплаты в журнале партнера"""
+    ledger.sync_payout(instance)
+
+
+def _deleting_partner(origin):
+    """Проверка "партнер удаляется в этом же удалении" по origin сигнала"""
+    def check(partner_id):
+        if isinstance(origin, User):
+            return origin.pk == partner_id
+        if isinstance(origin, QuerySet) and origin.model is User:
+            return origin.filter(pk=partner_id).exists()
+        return False
+    return check
+
+
+@receiver(pre_delete, sender=PartnerPayout)
+def payout_before_delete(sender, instance, origin=None, **kwargs):
+    """Возвращает удерживаемую сумму удаляемой выплаты"""
+    ledger.reverse_deleted('payout_id', instance.pk, _deleting_partner(origin))
+
+
+@receiver(pre_delete, sender=Booking)
+def booking_before_delete(sender, instance, origin=None, **kwargs):
+    """Сторнирует доход по удаляемому завершенному бронированию"""
+    ledger.reverse_deleted('booking_id', instance.pk, _deleting_partner(origin))
+
+
+@receiver([post_save, post_delete], sender=Car)
+def car_changed(sender, instance, **kwargs):
+    """Сбрасывает статистику при изменении автомобиля"""
+    invalidate_dashboard_stats()
+
+
+@receiver(post_save, sender=Car)
+def car_saved_availability(sender, instance, **kwargs):
+    """Пересчитывает флаг доступности, если мог измениться статус"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and 'status' not in update_fields:
+        return
+    car_id = instance.pk
+    transaction.on_commit(lambda: availability.refresh_car_availability(car_id))
+
+
+@receiver(post_save, sender=Car)
+def car_saved_quotes(sender, instance, **kwargs):
+    """Сбрасывает кеш цен при изменении тарифа автомобиля"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & {'price_per_hour', 'price_per_day'}:
+        return
+    invalidate_quotes(instance.pk)
+
+
+@receiver(post_save, sender=Car)
+def car_saved_search(sender, instance, **kwargs):
+    """Обновляет запись автомобиля в поисковом индексе"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    get_search_backend().index_car(instance)
+
+
+@receiver(post_delete, sender=Car)
+def car_deleted_search(sender, instance, **kwargs):
+    get_search_backend().remove_car(instance.pk)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создает поисковый индекс после migrate приложения cars"""
+    if sender.name == 'cars' and using == DEFAULT_DB_ALIAS:
+        setup_search_index()
+
+
+@receiver(post_save, sender=Car)
+def car_saved_thumbnails(sender, instance, **kwargs):
+    """Ставит в очередь создание миниатюр для нового фото автомобиля"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & {'image', 'image_thumbnail'}:
+        return
+    if not thumbnails.is_up_to_date(instance.image, instance.image_thumbnail):
+        thumbnails.schedule(thumbnails.process_car, instance.pk)
+
+
+@receiver(post_save, sender=CarImage)
+def car_image_saved(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & {'image', 'thumbnail'}:
+        return
+    if not thumbnails.is_up_to_date(instance.image, instance.thumbnail):
+        thumbnails.schedule(thumbnails.process_car_image, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=CarStatus)
+@receiver([post_save, post_delete], sender=BookingStatus)
+@receiver([post_save, post_delete], sender=PaymentType)
+@receiver([post_save, post_delete], sender=PaymentStatus)
+def lookup_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш справочника при его изменении"""
+    REGISTRIES[sender].invalidate()
+
+
+@receiver(pre_save, sender=Review)
+def review_before_save(sender, instance, **kwargs):
+    """Запоминает прежнее состояние отзыва для пересчета рейтинга"""
+    old = None
+    if instance.pk:
+        old = Review.objects.filter(pk=instance.pk).values(
+            'is_published', 'rating', 'partner_rating'
+        ).first()
+    if old:
+        instance._rating_before = ratings.review_contribution(
+            old['is_published'], old['rating'], old['partner_rating']
+        )
+    else:
+        instance._rating_before = (None, None)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, **kwargs):
+    old_state = getattr(instance, '_rating_before', (None, None))
+    ratings.apply_review_change(instance.booking.car_id, old_state, ratings.review_state(instance))
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    ratings.apply_review_change(instance.booking.car_id, ratings.review_state(instance), (None, None))
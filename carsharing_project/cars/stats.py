@@ -0,0 +1,87 @@
+"""
+Сводная статистика для дашбордов.
+
+Все счетчики считаются условной агрегацией (Count(filter=Q(...))) -
+по одному запросу на таблицу - и кешируются на короткое время.
+Кеш сбрасывается сигналами при изменении бронирований и автомобилей.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Booking, Car, MonthlyRevenue, User
+from .revenue import month_of, previous_month
+from .statuses import (
+    booking_statuses, car_statuses,
+    BOOKABLE_CAR_STATUSES, BOOKING_ACTIVE, BOOKING_COMPLETED
+)
+
+DASHBOARD_STATS_KEY = 'stats:dashboard'
+DASHBOARD_STATS_TIMEOUT = 60
+
+
+def _availability_counts():
+    return {
+        'total_cars': Count('id'),
+        'available_cars': Count('id', filter=Q(available_now=True)),
+        # Рабочие автомобили, занятые текущей арендой
+        'booked_cars': Count('id', filter=Q(
+            available_now=False, status_id__in=car_statuses.ids(BOOKABLE_CAR_STATUSES)
+        )),
+    }
+
+
+def _compute_dashboard_stats():
+    cars = Car.objects.aggregate(
+        total_partners=Count('partner', distinct=True),
+        **_availability_counts(),
+    )
+    bookings = Booking.objects.aggregate(
+        total_bookings=Count('id'),
+        active_bookings=Count('id', filter=Q(status_id=booking_statuses.id(BOOKING_ACTIVE))),
+        completed_bookings=Count('id', filter=Q(status_id=booking_statuses.id(BOOKING_COMPLETED))),
+    )
+
+    # Выручка - из помесячной сводки завершенных бронирований
+    this_month = month_of(timezone.now())
+    last_month = previous_month(this_month)
+    revenue = MonthlyRevenue.objects.aggregate(
+        total_revenue=Sum('revenue'),
+        month_revenue=Sum('revenue', filter=Q(month=this_month)),
+        last_month_revenue=Sum('revenue', filter=Q(month=last_month)),
+    )
+
+    stats = {**cars, **bookings}
+    stats['total_revenue'] = revenue['total_revenue'] or 0
+    stats['month_revenue'] = revenue['month_revenue'] or 0
+    stats['revenue_change'] = None
+    if revenue['last_month_revenue']:
+        stats['revenue_change'] = round(
+            (stats['month_revenue'] - revenue['last_month_revenue']) * 100 / revenue['last_month_revenue']
+        )
+    stats['total_users'] = User.objects.count()
+    return stats
+
+
+def get_dashboard_stats():
+    """Счетчики для главной страницы и панели администратора"""
+    stats = cache.get(DASHBOARD_STATS_KEY)
+    if stats is None:
+        stats = _compute_dashboard_stats()
+        cache.set(DASHBOARD_STATS_KEY, stats, DASHBOARD_STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(DASHBOARD_STATS_KEY)
+
+
+def count_by_status(queryset):
+    """Количество записей queryset по status_id одним GROUP BY"""
+    rows = queryset.order_by().values('status_id').annotate(count=Count('id'))
+    return {row['status_id']: row['count'] for row in rows}
+
+
+def count_availability(queryset):
+    """Всего, свободно сейчас и занято арендой - одним запросом"""
+    return queryset.order_by().aggregate(**_availability_counts())
@@ -0,0 +1,100 @@
+"""
+Кеш справочников статусов и типов.
+
+Справочники (CarStatus, BookingStatus, PaymentType, PaymentStatus) почти
+не меняются, поэтому загружаются один раз на процесс и сбрасываются
+сигналами при изменении. Это позволяет фильтровать по status_id без
+JOIN и не запрашивать статус по имени при каждой записи.
+"""
+import threading
+
+from .models import CarStatus, BookingStatus, PaymentType, PaymentStatus
+
+# Статусы автомобилей
+CAR_AVAILABLE = 'доступен'
+CAR_BOOKED = 'забронирован'
+CAR_MAINTENANCE = 'на обслуживании'
+CAR_UNAVAILABLE = 'недоступен'
+
+# Статусы, при которых автомобиль можно бронировать. Занятость по
+# бронированиям вычисляется (Car.available_now), "забронирован" больше
+# не записывается и остается только у старых записей
+BOOKABLE_CAR_STATUSES = [CAR_AVAILABLE, CAR_BOOKED]
+
+# Статусы бронирований
+BOOKING_CONFIRMED = 'подтверждено'
+BOOKING_ACTIVE = 'активно'
+BOOKING_COMPLETED = 'завершено'
+BOOKING_CANCELLED = 'отменено'
+
+# Статусы бронирований, которые занимают автомобиль
+BLOCKING_STATUSES = [BOOKING_CONFIRMED, BOOKING_ACTIVE]
+
+# Типы и статусы платежей
+PAYMENT_PREPAYMENT = 'предоплата'
+PAYMENT_PENDING = 'ожидает'
+
+
+class LookupRegistry:
+    """Ленивый кеш справочника: имя -> объект"""
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        """Возвращает пару словарей (по имени, по ID), загружая их при необходимости"""
+        data = self._data
+        if data is None:
+            with self._lock:
+                if self._data is None:
+                    objects = list(self.model.objects.all())
+                    self._data = (
+                        {obj.name: obj for obj in objects},
+                        {obj.pk: obj for obj in objects},
+                    )
+                data = self._data
+        return data
+
+    def get(self, name):
+        """Объект справочника по имени (DoesNotExist, если его нет)"""
+        try:
+            return self._load()[0][name]
+        except KeyError:
+            raise self.model.DoesNotExist(f'{self.model.__name__} "{name}" не найден')
+
+    def id(self, name):
+        """ID по имени; None, если записи нет (фильтр тогда ничего не найдет)"""
+        obj = self._load()[0].get(name)
+        return obj.pk if obj else None
+
+    def ids(self, names):
+        """Список ID для набора имен (отсутствующие пропускаются)"""
+        by_name = self._load()[0]
+        return [by_name[name].pk for name in names if name in by_name]
+
+    def name(self, pk):
+        """Имя по ID"""
+        obj = self._load()[1].get(pk)
+        return obj.name if obj else None
+
+    def all(self):
+        return list(self._load()[1].values())
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+
+car_statuses = LookupRegistry(CarStatus)
+booking_statuses = LookupRegistry(BookingStatus)
+payment_types = LookupRegistry(PaymentType)
+payment_statuses = LookupRegistry(PaymentStatus)
+
+REGISTRIES = {
+    CarStatus: car_statuses,
+    BookingStatus: booking_statuses,
+    PaymentType: payment_types,
+    PaymentStatus: payment_statuses,
+}
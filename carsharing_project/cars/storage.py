@@ -0,0 +1,120 @@
+"""
+Хранилище фотографий с адресацией по содержимому.
+
+Файл сохраняется под именем sha256 своего содержимого:
+car_images/ab/abcdef....jpg. Одинаковые фото (seed_data.py, повторные
+загрузки партнеров) хранятся на диске один раз, а ссылаются на них
+несколько записей Car/CarImage. Миниатюры называются по хешу исходного
+файла (<hash>_640x480.jpg), поэтому тоже не дублируются.
+
+Счетчик ссылок - количество строк Car/CarImage, чьи поля указывают на
+файл. Файл удаляется, только когда ссылок не осталось (release()).
+Так как содержимое по имени не меняется, такие файлы можно отдавать
+с заголовком Cache-Control: immutable.
+"""
+import hashlib
+import os
+import re
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+from django.views.static import serve
+
+# Поля, которые ссылаются на файлы хранилища
+MEDIA_FIELDS = {
+    'Car': ('image', 'image_thumbnail', 'image_thumbnail_webp'),
+    'CarImage': ('image', 'thumbnail', 'thumbnail_webp'),
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_HASH_RE = re.compile(r'^[0-9a-f]{64}')
+
+
+def is_addressed(name):
+    """Имя файла начинается с хеша содержимого"""
+    return bool(_HASH_RE.match(os.path.basename(name or '')))
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который именует файлы по хешу содержимого"""
+
+    def addressed_name(self, name, content):
+        directory, basename = os.path.split(name)
+        if not is_addressed(basename):
+            basename = content_hash(content) + os.path.splitext(basename)[1].lower()
+        return '/'.join(filter(None, [directory, basename[:2], basename]))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.addressed_name(self.generate_filename(name), content)
+        if self.exists(name):
+            # Такое содержимое уже хранится
+            return name
+        return super().save(name, content, max_length)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def reference_count(name):
+    """Количество полей Car/CarImage, которые ссылаются на файл"""
+    total = 0
+    for model_name, fields in MEDIA_FIELDS.items():
+        model = apps.get_model('cars', model_name)
+        for field in fields:
+            total += model.objects.filter(**{field: name}).count()
+    return total
+
+
+def release(names):
+    """
+    Удаляет файлы, на которые больше никто не ссылается.
+    Возвращает количество удаленных файлов.
+    """
+    deleted = 0
+    for name in set(filter(None, names)):
+        if reference_count(name) == 0 and media_storage.exists(name):
+            media_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+def car_media_names(car):
+    """Имена всех файлов автомобиля: основное фото, галерея и миниатюры"""
+    names = [getattr(car, field).name for field in MEDIA_FIELDS['Car']]
+    for row in car.images.values_list(*MEDIA_FIELDS['CarImage']):
+        names.extend(row)
+    return [name for name in names if name]
+
+
+def delete_car_with_media(car):
+    """Удаляет автомобиль и освобождает его файлы после фиксации транзакции"""
+    names = car_media_names(car)
+    with transaction.atomic():
+        car.delete()
+        transaction.on_commit(lambda: release(names))
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve с долгим кешированием адресуемых файлов"""
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code == 200 and is_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
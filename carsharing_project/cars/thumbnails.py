@@ -0,0 +1,113 @@
+"""
+Миниатюры фотографий автомобилей.
+
+После загрузки фото (CarImage.image или Car.image) фоновый поток создает
+миниатюру фиксированного размера в JPEG и WebP. Каталог и админка
+показывают миниатюры вместо оригиналов. Размеры оригинала записываются
+в модель самим ImageField (width_field/height_field).
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import Car, CarImage
+from .storage import release
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (640, 480)
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnails')
+
+
+def thumbnail_prefix(image_name):
+    """Префикс имени миниатюры для исходного файла"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{stem}_{THUMBNAIL_SIZE[0]}x{THUMBNAIL_SIZE[1]}'
+
+
+def is_up_to_date(image_field, thumbnail_field):
+    """Соответствует ли миниатюра текущему исходному файлу"""
+    if not image_field:
+        return True
+    if not thumbnail_field:
+        return False
+    return os.path.basename(thumbnail_field.name).startswith(thumbnail_prefix(image_field.name))
+
+
+def render_thumbnails(image_field):
+    """Возвращает (jpeg, webp) - содержимое миниатюр исходного изображения"""
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as source:
+            source = ImageOps.exif_transpose(source)
+            thumbnail = ImageOps.fit(source.convert('RGB'), THUMBNAIL_SIZE, Image.LANCZOS)
+    finally:
+        image_field.close()
+
+    jpeg = BytesIO()
+    thumbnail.save(jpeg, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    webp = BytesIO()
+    thumbnail.save(webp, 'WEBP', quality=WEBP_QUALITY, method=6)
+    return jpeg.getvalue(), webp.getvalue()
+
+
+def _store(instance, image_field_name, jpeg_field_name, webp_field_name):
+    image_field = getattr(instance, image_field_name)
+    jpeg, webp = render_thumbnails(image_field)
+    prefix = thumbnail_prefix(image_field.name)
+
+    jpeg_field = getattr(instance, jpeg_field_name)
+    webp_field = getattr(instance, webp_field_name)
+    old_names = [jpeg_field.name, webp_field.name]
+    jpeg_field.save(f'{prefix}.jpg', ContentFile(jpeg), save=False)
+    webp_field.save(f'{prefix}.webp', ContentFile(webp), save=False)
+
+    # update() вместо save(), чтобы не вызывать сигналы повторно
+    type(instance).objects.filter(pk=instance.pk).update(**{
+        jpeg_field_name: jpeg_field.name,
+        webp_field_name: webp_field.name,
+    })
+    # Старые миниатюры могут использоваться другими фото с тем же содержимым
+    release(old_names)
+
+
+def process_car_image(image_id, force=False):
+    image = CarImage.objects.filter(pk=image_id).first()
+    if image is None or not image.image:
+        return False
+    if not force and is_up_to_date(image.image, image.thumbnail):
+        return False
+    _store(image, 'image', 'thumbnail', 'thumbnail_webp')
+    return True
+
+
+def process_car(car_id, force=False):
+    car = Car.objects.filter(pk=car_id).first()
+    if car is None or not car.image:
+        return False
+    if not force and is_up_to_date(car.image, car.image_thumbnail):
+        return False
+    _store(car, 'image', 'image_thumbnail', 'image_thumbnail_webp')
+    return True
+
+
+def _run(func, pk):
+    try:
+        func(pk)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру (%s, id=%s)', func.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(func, pk):
+    """Запускает обработку в фоне после фиксации транзакции"""
+    transaction.on_commit(lambda: _executor.submit(_run, func, pk))
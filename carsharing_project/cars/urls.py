@@ -12,9 +12,11 @@ urlpatterns = [
 
     # Автомобили
     path('cars/', views.car_list, name='car_list'),
+    path('cars/available/', views.available_cars_api, name='available_cars_api'),
     path('cars/<int:car_id>/', views.car_detail, name='car_detail'),
     path('cars/<int:car_id>/book/', views.book_car, name='book_car'),
     path('cars/<int:car_id>/check-availability/', views.check_availability, name='check_availability'),
+    path('cars/<int:car_id>/calendar/', views.car_calendar, name='car_calendar'),
 
     # Бронирования
     path('bookings/', views.my_bookings, name='my_bookings'),
@@ -22,6 +24,9 @@ urlpatterns = [
     path('bookings/<int:booking_id>/cancel/', views.cancel_booking, name='cancel_booking'),
     path('bookings/<int:booking_id>/review/', views.add_review, name='add_review'),
 
+    # Выгрузки (bookings/payments/payouts, csv/xlsx)
+    path('export/<str:kind>.<str:fmt>', views.export_data, name='export_data'),
+
     # Административные маршруты (НАЧИНАЕМ С admin-panel/)
     path('admin-panel/dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-panel/cars/', views.manage_cars, name='manage_cars'),
@@ -61,6 +66,7 @@ urlpatterns = [
     path('partner/become/', views.become_partner, name='become_partner'),
     path('partner/cars/', views.partner_cars, name='partner_cars'),
     path('partner/cars/add/', views.partner_add_car, name='partner_add_car'),
+    path('partner/cars/import/', views.partner_import_cars, name='partner_import_cars'),
     path('partner/cars/<int:car_id>/edit/', views.partner_edit_car, name='partner_edit_car'),
     path('partner/cars/<int:car_id>/delete/', views.partner_delete_car, name='partner_delete_car'),
     path('partner/bookings/', views.partner_bookings, name='partner_bookings'),
@@ -0,0 +1,282 @@
+"""
+Загрузка парка.
+
+fleet_utilization() считает по интервалам бронирований за период:
+- долю часов, когда автомобиль был в аренде (пересекающиеся интервалы
+  объединяются);
+- простои между арендами: количество и самый длинный;
+- выручку на доступный час (стоимость бронирований пропорционально
+  попавшей в период части аренды).
+
+Результат - по автомобилям, категориям, партнерам и по парку в целом.
+Доступное время автомобиля отсчитывается от начала периода или от даты
+его добавления, если он добавлен позже.
+
+Интервалы всех автомобилей обрабатываются одним проходом по массивам:
+после сортировки по (автомобиль, начало) к времени добавляется сдвиг
+номер_автомобиля * (длина периода + 1), и накопленный максимум концов
+(np.maximum.accumulate) считается сразу для всех автомобилей без
+смешивания соседних. При отсутствии NumPy тот же алгоритм выполняется
+циклом.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен
+    np = None
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Booking, Car
+from .pricing import to_minor, from_minor
+from .statuses import booking_statuses, BOOKING_ACTIVE, BOOKING_COMPLETED
+
+# Бронирования, время которых считается арендой
+RENTED_STATUSES = [BOOKING_ACTIVE, BOOKING_COMPLETED]
+
+SECONDS_PER_HOUR = 3600
+
+# Период отчета на дашбордах, суток
+DASHBOARD_PERIOD_DAYS = 30
+REPORT_CACHE_TIMEOUT = 600
+_REPORT_KEY = 'utilization:{partner}:{days}'
+
+
+class Utilization:
+    """Загрузка автомобиля или группы автомобилей за период"""
+
+    def __init__(self, busy=0, available=0, revenue_minor=0, bookings=0, gaps=0, longest_gap=0):
+        self.busy = busy  # секунд в аренде
+        self.available = available  # секунд доступности
+        self.revenue_minor = revenue_minor
+        self.bookings = bookings
+        self.gaps = gaps
+        self.longest_gap = longest_gap  # секунд
+
+    def add(self, other):
+        self.busy += other.busy
+        self.available += other.available
+        self.revenue_minor += other.revenue_minor
+        self.bookings += other.bookings
+        self.gaps += other.gaps
+        self.longest_gap = max(self.longest_gap, other.longest_gap)
+
+    @property
+    def rate(self):
+        """Доля времени в аренде, 0..1"""
+        return self.busy / self.available if self.available else 0.0
+
+    @property
+    def percent(self):
+        return round(self.rate * 100, 1)
+
+    @property
+    def busy_hours(self):
+        return round(self.busy / SECONDS_PER_HOUR, 1)
+
+    @property
+    def available_hours(self):
+        return round(self.available / SECONDS_PER_HOUR, 1)
+
+    @property
+    def longest_gap_hours(self):
+        return round(self.longest_gap / SECONDS_PER_HOUR, 1)
+
+    @property
+    def revenue(self):
+        return from_minor(round(self.revenue_minor))
+
+    @property
+    def revenue_per_hour(self):
+        """Выручка на доступный час"""
+        if not self.available:
+            return Decimal('0.00')
+        return from_minor(round(self.revenue_minor * SECONDS_PER_HOUR / self.available))
+
+    def __repr__(self):
+        return f'<Utilization {self.percent}% из {self.available_hours} ч>'
+
+
+def _sweep_numpy(car_index, starts, ends, prices, window_starts, length):
+    """
+    По сырым интервалам (секунды от начала периода) и ценам в копейках
+    возвращает списки по автомобилям: занятое время, выручка, количество
+    бронирований, количество и максимум простоев.
+    """
+    count = len(window_starts)
+    window_starts = np.asarray(window_starts, dtype=np.int64)
+    busy = np.zeros(count, dtype=np.int64)
+    revenue = np.zeros(count)
+    booked = np.zeros(count, dtype=np.int64)
+    gaps = np.zeros(count, dtype=np.int64)
+    longest = np.zeros(count, dtype=np.int64)
+    last_end = window_starts.copy()
+
+    car_index = np.asarray(car_index, dtype=np.int64)
+    raw_starts = np.asarray(starts, dtype=np.int64)
+    raw_ends = np.asarray(ends, dtype=np.int64)
+    starts = np.maximum(raw_starts, window_starts[car_index]) if len(car_index) else raw_starts
+    ends = np.minimum(raw_ends, length)
+    inside = ends > starts
+
+    if inside.any():
+        # Выручка - пропорционально части аренды внутри периода
+        duration = raw_ends - raw_starts
+        share = np.where(duration > 0, (ends - starts) / np.maximum(duration, 1), 0)
+        prices = np.asarray(prices, dtype=np.int64)
+        revenue = np.bincount(car_index[inside], weights=(prices * share)[inside], minlength=count)
+        booked = np.bincount(car_index[inside], minlength=count)
+
+        car_index, starts, ends = car_index[inside], starts[inside], ends[inside]
+        order = np.lexsort((starts, car_index))
+        car_index, starts, ends = car_index[order], starts[order], ends[order]
+
+        offset = car_index * (length + 1)
+        shifted_starts = starts + offset
+        reach = np.maximum.accumulate(ends + offset)
+
+        # Конец уже покрытого времени перед каждым интервалом; для первого
+        # интервала автомобиля - начало его доступности
+        covered = np.empty_like(reach)
+        covered[1:] = reach[:-1]
+        first = np.ones(len(car_index), dtype=bool)
+        first[1:] = car_index[1:] != car_index[:-1]
+        covered[first] = window_starts[car_index[first]] + offset[first]
+
+        added = np.maximum(ends + offset - np.maximum(shifted_starts, covered), 0)
+        busy = np.bincount(car_index, weights=added, minlength=count).astype(np.int64)
+
+        gap = np.maximum(shifted_starts - covered, 0)
+        gaps = np.bincount(car_index, weights=(gap > 0).astype(np.int64), minlength=count).astype(np.int64)
+        np.maximum.at(longest, car_index, gap)
+        np.maximum.at(last_end, car_index, ends)
+
+    # Простой от последней аренды до конца периода
+    tail = length - last_end
+    gaps += tail > 0
+    longest = np.maximum(longest, tail)
+    return busy.tolist(), revenue.tolist(), booked.tolist(), gaps.tolist(), longest.tolist()
+
+
+def _sweep_python(car_index, starts, ends, prices, window_starts, length):
+    count = len(window_starts)
+    busy, revenue, booked = [0] * count, [0.0] * count, [0] * count
+    gaps, longest = [0] * count, [0] * count
+
+    intervals = []
+    for car, raw_start, raw_end, price in zip(car_index, starts, ends, prices):
+        start, end = max(raw_start, window_starts[car]), min(raw_end, length)
+        if end <= start:
+            continue
+        intervals.append((car, start, end))
+        booked[car] += 1
+        if raw_end > raw_start:
+            revenue[car] += price * (end - start) / (raw_end - raw_start)
+
+    covered = list(window_starts)
+    for car, start, end in sorted(intervals):
+        gap = start - covered[car]
+        if gap > 0:
+            gaps[car] += 1
+            longest[car] = max(longest[car], gap)
+        if end > covered[car]:
+            busy[car] += end - max(start, covered[car])
+            covered[car] = end
+    for car in range(count):
+        tail = length - covered[car]
+        if tail > 0:
+            gaps[car] += 1
+            longest[car] = max(longest[car], tail)
+    return busy, revenue, booked, gaps, longest
+
+
+def fleet_utilization(start, end, cars=None):
+    """
+    Загрузка за период [start, end). cars - queryset автомобилей
+    (по умолчанию весь парк).
+
+    Возвращает словарь: 'fleet' - Utilization парка, 'cars',
+    'categories', 'partners' - словари {ID: Utilization}
+    (категория None - автомобили без категории).
+    """
+    cars = Car.objects.all() if cars is None else cars
+    car_rows = list(cars.filter(created_at__lt=end).values_list(
+        'id', 'partner_id', 'category_id', 'created_at'
+    ))
+    length = int((end - start).total_seconds())
+    origin = start.timestamp()
+
+    index = {}
+    window_starts = []
+    for car_id, partner_id, category_id, created_at in car_rows:
+        index[car_id] = len(window_starts)
+        window_starts.append(max(int(created_at.timestamp() - origin), 0))
+
+    bookings = Booking.objects.filter(
+        car_id__in=cars.values('id'),
+        status_id__in=booking_statuses.ids(RENTED_STATUSES),
+        start_date__lt=end,
+        end_date__gt=start,
+    ).values_list('car_id', 'start_date', 'end_date', 'calculated_price')
+
+    car_index, starts, ends, prices = [], [], [], []
+    for car_id, start_date, end_date, price in bookings.iterator(chunk_size=5000):
+        car = index.get(car_id)
+        if car is not None:
+            car_index.append(car)
+            starts.append(int(start_date.timestamp() - origin))
+            ends.append(int(end_date.timestamp() - origin))
+            prices.append(to_minor(price))
+
+    sweep = _sweep_python if np is None else _sweep_numpy
+    busy, revenue, booked, gaps, longest = sweep(
+        car_index, starts, ends, prices, window_starts, length
+    )
+
+    report = {
+        'fleet': Utilization(),
+        'cars': {},
+        'categories': defaultdict(Utilization),
+        'partners': defaultdict(Utilization),
+    }
+    for car_id, partner_id, category_id, created_at in car_rows:
+        car = index[car_id]
+        result = Utilization(
+            busy=busy[car],
+            available=length - window_starts[car],
+            revenue_minor=revenue[car],
+            bookings=booked[car],
+            gaps=gaps[car],
+            longest_gap=longest[car],
+        )
+        report['cars'][car_id] = result
+        report['categories'][category_id].add(result)
+        report['partners'][partner_id].add(result)
+        report['fleet'].add(result)
+
+    report['categories'] = dict(report['categories'])
+    report['partners'] = dict(report['partners'])
+    return report
+
+
+def last_days(days, now=None):
+    """Период из days последних полных суток"""
+    today = timezone.localtime(now or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days), today
+
+
+def get_utilization_report(days=DASHBOARD_PERIOD_DAYS, partner_id=None):
+    """Отчет за последние days суток для дашбордов (кешируется)"""
+    key = _REPORT_KEY.format(partner=partner_id or 'all', days=days)
+    report = cache.get(key)
+    if report is None:
+        cars = Car.objects.all()
+        if partner_id is not None:
+            cars = cars.filter(partner_id=partner_id)
+        report = fleet_utilization(*last_days(days), cars=cars)
+        cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
@@ -3,12 +3,36 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db.models import Q, Count, Sum
+from django.db import transaction
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, Http404
 import datetime
 from .models import *
 from .forms import *
-from decimal import Decimal
+from .statuses import (
+    car_statuses, booking_statuses,
+    CAR_AVAILABLE, BOOKING_CONFIRMED, BOOKING_ACTIVE,
+    BOOKING_COMPLETED, BOOKING_CANCELLED, BLOCKING_STATUSES
+)
+from .stats import get_dashboard_stats, count_by_status, count_availability
+from .pagination import paginate
+from .images import annotate_image_info
+from .storage import delete_car_with_media
+from .booking import create_booking
+from .ledger import get_balance
+from .revenue import monthly_totals, month_of, revenue_for_month
+from .utilization import get_utilization_report, DASHBOARD_PERIOD_DAYS
+from .car_import import import_cars, IMPORT_FIELDS, MAX_UPLOAD_ROWS
+from .exports import (
+    EXPORTS, CSV, XLSX, xlsx_available, scoped_queryset, filter_queryset, export_response
+)
+from .pricing import quote_many, from_minor
+from .quotes import get_quote
+from .search import search_cars, has_search_terms, get_backend as get_search_backend
+from .availability import (
+    filter_available, available_cars, bookable_cars,
+    get_unavailable_ranges, CALENDAR_HORIZON_DAYS
+)
 from django.contrib import messages
 from .forms import ReviewForm
 from .models import SupportChat, SupportMessage
@@ -27,14 +51,17 @@ def is_manager_or_admin(user):
     return user.is_staff  # staff включает и менеджеров, и админов
 # Главная страница
 def home(request):
-    cars = Car.objects.filter(status__name='доступен').order_by('-created_at')[:6]
+    cars = annotate_image_info(
+        Car.objects.filter(available_now=True)
+    ).order_by('-created_at')[:6]
     categories = CarCategory.objects.all()
 
     # Статистика для главной страницы
+    dashboard_stats = get_dashboard_stats()
     stats = {
-        'total_cars': Car.objects.count(),
-        'total_bookings': Booking.objects.count(),
-        'available_cars': Car.objects.filter(status__name='доступен').count(),
+        'total_cars': dashboard_stats['total_cars'],
+        'total_bookings': dashboard_stats['total_bookings'],
+        'available_cars': dashboard_stats['available_cars'],
     }
 
     context = {
@@ -90,12 +117,30 @@ def user_logout(request):
     return redirect('home')
 
 
+def _parse_datetime(value):
+    """Дата-время из ISO-строки; без часового пояса - в текущем поясе"""
+    moment = datetime.datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
 # Каталог автомобилей
 def car_list(request):
-    cars = Car.objects.filter(status__name='доступен').select_related(
-        'transmission', 'category', 'status', 'partner'
-    ).prefetch_related(
-        'images'
+    # Без периода показываем свободные сейчас, с периодом - свободные в этот период
+    start_date = request.GET.get('start_date', '')
+    end_date = request.GET.get('end_date', '')
+    period = None
+    if start_date and end_date:
+        try:
+            period = (_parse_datetime(start_date), _parse_datetime(end_date))
+        except ValueError:
+            period = None
+        if period and period[1] <= period[0]:
+            period = None
+    cars = bookable_cars() if period else Car.objects.filter(available_now=True)
+    cars = annotate_image_info(
+        cars.select_related('transmission', 'category', 'status', 'partner')
     ).order_by('-created_at')
 
     # Фильтрация
@@ -123,31 +168,46 @@ def car_list(request):
         except ValueError:
             pass
 
-    if search:
-        cars = cars.filter(
-            Q(brand__icontains=search) |
-            Q(model__icontains=search) |
-            Q(description__icontains=search) |
-            Q(address__icontains=search)
-        )
-
-    # Сортировка
-    sort_by = request.GET.get('sort', 'newest')
-    if sort_by == 'price_asc':
-        cars = cars.order_by('price_per_hour')
+    # Строка без слов ("!!", пробелы) поиском не считается
+    searching = has_search_terms(search)
+    if searching:
+        cars = search_cars(cars, search)
+
+    # Свободные на выбранный период
+    if period:
+        cars = filter_available(cars, *period)
+
+    # Сортировка (при поиске по умолчанию - по релевантности)
+    rank_ordering = get_search_backend().rank_ordering if searching else None
+    sort_by = request.GET.get('sort', 'relevance' if rank_ordering else 'newest')
+    if sort_by == 'relevance' and rank_ordering:
+        ordering = rank_ordering
+    elif sort_by == 'price_asc':
+        ordering = ('price_per_hour', 'id')
     elif sort_by == 'price_desc':
-        cars = cars.order_by('-price_per_hour')
+        ordering = ('-price_per_hour', '-id')
     elif sort_by == 'year_desc':
-        cars = cars.order_by('-year')
+        ordering = ('-year', '-id')
+    elif sort_by == 'rating_desc':
+        ordering = ('-rating_avg', '-id')
     else:
-        cars = cars.order_by('-created_at')
+        ordering = ('-created_at', '-id')
+
+    page_obj, querystring = paginate(request, cars, ordering=ordering, with_total=True)
+
+    # Стоимость аренды за выбранный период для всей страницы разом
+    if period:
+        prices = quote_many(page_obj.object_list, [period])
+        for car, row in zip(page_obj.object_list, prices):
+            car.period_price = from_minor(row[0])
 
     # Получаем все фильтры
     categories = CarCategory.objects.all()
     transmissions = TransmissionType.objects.all()
 
     context = {
-        'cars': cars,
+        'cars': page_obj,
+        'querystring': querystring,
         'categories': categories,
         'transmissions': transmissions,
         'selected_category': category_id,
@@ -156,6 +216,8 @@ def car_list(request):
         'max_price': max_price,
         'search_query': search,
         'sort_by': sort_by,
+        'start_date': start_date,
+        'end_date': end_date,
     }
     return render(request, 'cars/car_list.html', context)
 
@@ -164,35 +226,28 @@ def car_list(request):
 def car_detail(request, car_id):
     car = get_object_or_404(Car, id=car_id)
 
-    # Проверяем доступность на даты
-    available_dates = []
-    unavailable_dates = []
-    today = timezone.now()
-    # Получаем все бронирования автомобиля
-    bookings = Booking.objects.filter(
-        car=car,
-        status__name__in=['подтверждено', 'активно']
-    )
-
-    for booking in bookings:
-        # Добавляем даты бронирования как недоступные
-        current_date = booking.start_date.date()
-        end_date = booking.end_date.date()
-        while current_date <= end_date:
-            unavailable_dates.append(current_date.strftime('%Y-%m-%d'))
-            current_date += datetime.timedelta(days=1)
-
     # Получаем отзывы
     reviews = Review.objects.filter(booking__car=car).select_related('booking__client')
 
     context = {
         'car': car,
         'reviews': reviews,
-        'unavailable_dates': unavailable_dates,
     }
     return render(request, 'cars/car_detail.html', context)
 
 
+# API календаря занятости автомобиля
+def car_calendar(request, car_id):
+    if not Car.objects.filter(id=car_id).exists():
+        return JsonResponse({'error': 'Car not found'}, status=404)
+
+    return JsonResponse({
+        'car_id': car_id,
+        'horizon_days': CALENDAR_HORIZON_DAYS,
+        'unavailable': get_unavailable_ranges(car_id),
+    })
+
+
 # Бронирование автомобиля
 @login_required
 def book_car(request, car_id):
@@ -207,74 +262,20 @@ def book_car(request, car_id):
             booking.client = request.user
             booking.car = car
 
-            # Расчет стоимости
-            duration = booking.end_date - booking.start_date
-            hours = duration.total_seconds() / 3600
-
-            # ИСПРАВЛЕНИЕ 1: Преобразуем hours в Decimal для корректного умножения
-            hours_decimal = Decimal(str(hours))
-
-            if hours <= 24:
-                # Умножаем Decimal на Decimal
-                price = car.price_per_hour * hours_decimal
-            else:
-                days = hours / 24
-                # Преобразуем days в Decimal
-                days_decimal = Decimal(str(days))
-                price = car.price_per_day * days_decimal
-
-            booking.calculated_price = round(price, 2)
-
-            # Проверяем доступность (статус "доступен")
-            if car.status.name != 'доступен':
-                messages.error(request, 'Автомобиль временно недоступен для бронирования')
-                return redirect('car_detail', car_id=car.id)
-
-            # Проверяем пересечения с другими бронированиями
-            overlapping = Booking.objects.filter(
-                car=car,
-                start_date__lt=booking.end_date,
-                end_date__gt=booking.start_date,
-                status__name__in=['подтверждено', 'активно']
-            ).exists()
-
-            if overlapping:
-                messages.error(request, 'Автомобиль недоступен на выбранные даты')
-                return redirect('car_detail', car_id=car.id)
-
             try:
-                # Получаем статус "подтверждено"
-                confirmed_status = BookingStatus.objects.get(name='подтверждено')
-                booking.status = confirmed_status
-                booking.save()
-
-                # Меняем статус автомобиля на "забронирован"
-                booked_status = CarStatus.objects.get(name='забронирован')
-                car.status = booked_status
-                car.save()
-
-                # Создаем платеж (предоплата)
-                payment_type = PaymentType.objects.get(name='предоплата')
-                payment_status = PaymentStatus.objects.get(name='ожидает')
-
-                # ИСПРАВЛЕНИЕ 2: Преобразуем для предоплаты
-                prepayment_percent = Decimal('0.3')  # Используем Decimal для процента
-                prepayment_amount = booking.calculated_price * prepayment_percent
-
-                Payment.objects.create(
-                    booking=booking,
-                    amount=prepayment_amount,
-                    payment_type=payment_type,
-                    status=payment_status
-                )
-
-                messages.success(request,
-                                 f'Бронирование создано! Сумма: {booking.calculated_price} руб. Ожидайте подтверждения менеджером.')
-                return redirect('booking_detail', booking_id=booking.id)
-
+                # Проверка, блокировка автомобиля и предоплата - одной транзакцией
+                result = create_booking(booking)
             except Exception as e:
                 messages.error(request, f'Ошибка при создании бронирования: {str(e)}')
                 return redirect('car_detail', car_id=car.id)
+
+            if not result.ok:
+                messages.error(request, result.message)
+                return redirect('car_detail', car_id=car.id)
+
+            messages.success(request,
+                             f'Бронирование создано! Сумма: {booking.calculated_price} руб. Ожидайте подтверждения менеджером.')
+            return redirect('booking_detail', booking_id=booking.id)
         else:
             # Если форма невалидна, показываем ошибки
             for field, errors in form.errors.items():
@@ -304,12 +305,16 @@ def my_bookings(request):
     ).order_by('-created_at')
 
     # Разделяем по статусам
-    active_bookings = bookings.filter(status__name__in=['подтверждено', 'активно'])
-    past_bookings = bookings.filter(status__name__in=['завершено', 'отменено'])
+    active_bookings = bookings.filter(status_id__in=booking_statuses.ids(BLOCKING_STATUSES))
+    past_bookings = bookings.filter(status_id__in=booking_statuses.ids([BOOKING_COMPLETED, BOOKING_CANCELLED]))
+
+    # История растет со временем - выводим ее постранично
+    past_page, querystring = paginate(request, past_bookings)
 
     context = {
         'active_bookings': active_bookings,
-        'past_bookings': past_bookings,
+        'past_bookings': past_page,
+        'querystring': querystring,
     }
     return render(request, 'cars/my_bookings.html', context)
 
@@ -326,7 +331,7 @@ def booking_detail(request, booking_id):
     payments = Payment.objects.filter(booking=booking)
 
     # Проверяем, можно ли оставить отзыв
-    can_review = (booking.status.name == 'завершено' and
+    can_review = (booking.status_id == booking_statuses.id(BOOKING_COMPLETED) and
                   not hasattr(booking, 'review') and
                   booking.client == request.user)  # Только свой отзыв
 
@@ -343,17 +348,13 @@ def cancel_booking(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, client=request.user)
 
     # Используем or вместо списка
-    if booking.status.name == 'подтверждено' or booking.status.name == 'активно':
+    if booking.status_id in booking_statuses.ids(BLOCKING_STATUSES):
         # Получаем статус "отменено"
-        cancelled_status = BookingStatus.objects.get(name='отменено')
+        cancelled_status = booking_statuses.get(BOOKING_CANCELLED)
         booking.status = cancelled_status
+        # Доступность автомобиля пересчитается по его бронированиям
         booking.save()
 
-        # Освобождаем автомобиль
-        available_status = CarStatus.objects.get(name='доступен')
-        booking.car.status = available_status
-        booking.car.save()
-
         messages.success(request, 'Бронирование успешно отменено')
     else:
         messages.error(request, 'Невозможно отменить это бронирование')
@@ -381,10 +382,10 @@ def profile(request):
 
     user_stats = {
         'total_bookings': Booking.objects.filter(client=user).count(),
-        'active_bookings': Booking.objects.filter(client=user, status__name='активно').count(),
+        'active_bookings': Booking.objects.filter(client=user, status_id=booking_statuses.id(BOOKING_ACTIVE)).count(),
         'total_spent': Booking.objects.filter(
             client=user,
-            status__name='завершено'
+            status_id=booking_statuses.id(BOOKING_COMPLETED)
         ).aggregate(Sum('calculated_price'))['calculated_price__sum'] or 0,
     }
 
@@ -509,7 +510,7 @@ def add_review(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, client=request.user)
 
     # Проверяем, что бронирование завершено
-    if booking.status.name != 'завершено':
+    if booking.status_id != booking_statuses.id(BOOKING_COMPLETED):
         messages.error(request, 'Отзыв можно оставить только после завершения бронирования')
         return redirect('booking_detail', booking_id=booking.id)
 
@@ -556,7 +557,7 @@ def add_review(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, client=request.user)
 
     # Используем or вместо списка в проверках
-    if booking.status.name != 'завершено':
+    if booking.status_id != booking_statuses.id(BOOKING_COMPLETED):
         messages.error(request, 'Можно оставить отзыв только для завершенных бронирований')
         return redirect('my_bookings')
 
@@ -592,17 +593,7 @@ def is_admin(user):
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     # Статистика
-    stats = {
-        'total_cars': Car.objects.count(),
-        'available_cars': Car.objects.filter(status__name='доступен').count(),
-        'booked_cars': Car.objects.filter(status__name='забронирован').count(),
-        'total_bookings': Booking.objects.count(),
-        'active_bookings': Booking.objects.filter(status__name='активно').count(),
-        'completed_bookings': Booking.objects.filter(status__name='завершено').count(),
-        'total_users': User.objects.count(),
-        'total_partners': User.objects.filter(cars__isnull=False).distinct().count(),
-        'total_revenue': Booking.objects.aggregate(total=Sum('final_price'))['total'] or 0,
-    }
+    stats = get_dashboard_stats()
 
     # Последние бронирования
     recent_bookings = Booking.objects.select_related(
@@ -612,10 +603,24 @@ def admin_dashboard(request):
     # Последние автомобили
     recent_cars = Car.objects.select_related('partner', 'category').order_by('-created_at')[:10]
 
+    # Загрузка парка за 30 дней по категориям
+    utilization = get_utilization_report(DASHBOARD_PERIOD_DAYS)
+    category_names = dict(CarCategory.objects.values_list('id', 'name'))
+    category_utilization = sorted(
+        [
+            (category_names.get(category_id, 'Без категории'), result)
+            for category_id, result in utilization['categories'].items()
+        ],
+        key=lambda row: row[1].rate, reverse=True
+    )
+
     context = {
         'stats': stats,
         'recent_bookings': recent_bookings,
         'recent_cars': recent_cars,
+        'utilization_days': DASHBOARD_PERIOD_DAYS,
+        'fleet_utilization': utilization['fleet'],
+        'category_utilization': category_utilization,
     }
     return render(request, 'cars/admin/dashboard.html', context)
 
@@ -638,19 +643,17 @@ def manage_cars(request):
     statuses = CarStatus.objects.all()
     categories = CarCategory.objects.all()
 
-    # Подсчет статистики
-    total_cars = cars.count()
-    available_count = 0
-    booked_count = 0
+    # Подсчет статистики (GROUP BY на стороне БД)
+    counts = count_availability(cars)
+    total_cars = counts['total_cars']
+    available_count = counts['available_cars']
+    booked_count = counts['booked_cars']
 
-    for car in cars:
-        if car.status.name == 'доступен':
-            available_count += 1
-        elif car.status.name == 'забронирован':
-            booked_count += 1
+    page_obj, querystring = paginate(request, cars)
 
     context = {
-        'cars': cars,
+        'cars': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'categories': categories,
         'selected_status': status_filter,
@@ -671,7 +674,7 @@ def add_car(request):
             car = form.save(commit=False)
             car.partner = request.user
             # Получаем статус "доступен"
-            available_status = CarStatus.objects.get(name='доступен')
+            available_status = car_statuses.get(CAR_AVAILABLE)
             car.status = available_status
             car.save()
             messages.success(request, 'Автомобиль успешно добавлен')
@@ -691,20 +694,17 @@ def edit_car(request, car_id):
     car = get_object_or_404(Car, id=car_id)
 
     # Подсчитываем статистику
-    completed_bookings_count = Booking.objects.filter(
-        car=car,
-        status__name='завершено'
-    ).count()
+    car_revenue = MonthlyRevenue.objects.filter(car=car).aggregate(
+        total=Sum('revenue'), count=Sum('bookings_count')
+    )
+    completed_bookings_count = car_revenue['count'] or 0
 
     active_bookings_count = Booking.objects.filter(
         car=car,
-        status__name__in=['подтверждено', 'активно']
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
     ).count()
 
-    total_revenue = Booking.objects.filter(
-        car=car,
-        status__name='завершено'
-    ).aggregate(total=Sum('calculated_price'))['total'] or 0
+    total_revenue = car_revenue['total'] or 0
 
     if request.method == 'POST':
         form = CarForm(request.POST, request.FILES, instance=car)
@@ -731,7 +731,7 @@ def delete_car(request, car_id):
     car = get_object_or_404(Car, id=car_id)
 
     if request.method == 'POST':
-        car.delete()
+        delete_car_with_media(car)
         messages.success(request, 'Автомобиль успешно удален')
         return redirect('manage_cars')
 
@@ -755,22 +755,18 @@ def manage_bookings(request):
     # Получаем фильтры
     statuses = BookingStatus.objects.all()
 
-    # Подсчет статистики
-    total_bookings = bookings.count()
-    active_count = 0
-    confirmed_count = 0
-    completed_count = 0
+    # Подсчет статистики (GROUP BY на стороне БД)
+    status_counts = count_by_status(bookings)
+    total_bookings = sum(status_counts.values())
+    active_count = status_counts.get(booking_statuses.id(BOOKING_ACTIVE), 0)
+    confirmed_count = status_counts.get(booking_statuses.id(BOOKING_CONFIRMED), 0)
+    completed_count = status_counts.get(booking_statuses.id(BOOKING_COMPLETED), 0)
 
-    for booking in bookings:
-        if booking.status.name == 'активно':
-            active_count += 1
-        elif booking.status.name == 'подтверждено':
-            confirmed_count += 1
-        elif booking.status.name == 'завершено':
-            completed_count += 1
+    page_obj, querystring = paginate(request, bookings)
 
     context = {
-        'bookings': bookings,
+        'bookings': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'selected_status': status_filter,
         'total_bookings': total_bookings,
@@ -790,25 +786,16 @@ def change_booking_status(request, booking_id):
     if request.method == 'POST':
         new_status_id = request.POST.get('status')
         new_status = get_object_or_404(BookingStatus, id=new_status_id)
-        old_status = booking.status
+        old_status_name = booking_statuses.name(booking.status_id)
 
         booking.status = new_status
-        booking.save()
-
-        # Логика изменения статуса автомобиля
-        if new_status.name == 'завершено' or new_status.name == 'отменено':
-            # Освобождаем автомобиль
-            available_status = CarStatus.objects.get(name='доступен')
-            booking.car.status = available_status
-            booking.car.save()
-        elif new_status.name == 'активно':
-            # Бронируем автомобиль
-            booked_status = CarStatus.objects.get(name='забронирован')
-            booking.car.status = booked_status
-            booking.car.save()
+        # Доступность автомобиля пересчитается по его бронированиям,
+        # доход партнера проводится в той же транзакции
+        with transaction.atomic():
+            booking.save()
 
         messages.success(request,
-                         f'Статус бронирования #{booking.id} изменен с "{old_status.name}" на "{new_status.name}"')
+                         f'Статус бронирования #{booking.id} изменен с "{old_status_name}" на "{new_status.name}"')
 
         # Возвращаемся на ту же страницу
         return redirect(request.META.get('HTTP_REFERER', 'manager_bookings'))
@@ -819,24 +806,25 @@ def change_booking_status(request, booking_id):
 # Управление пользователями
 @user_passes_test(is_admin)
 def manage_users(request):
-    users = User.objects.all().order_by('-date_joined')
-
-    # Подсчет статистики
-    total_users = users.count()
-    admin_count = 0
-    staff_count = 0
-    client_count = 0
-
-    for user_obj in users:
-        if user_obj.is_superuser:
-            admin_count += 1
-        elif user_obj.is_staff:
-            staff_count += 1
-        else:
-            client_count += 1
+    users = User.objects.all()
+
+    # Подсчет статистики одним запросом
+    counts = users.aggregate(
+        total_users=Count('id'),
+        admin_count=Count('id', filter=Q(is_superuser=True)),
+        staff_count=Count('id', filter=Q(is_staff=True, is_superuser=False)),
+        client_count=Count('id', filter=Q(is_staff=False, is_superuser=False)),
+    )
+    total_users = counts['total_users']
+    admin_count = counts['admin_count']
+    staff_count = counts['staff_count']
+    client_count = counts['client_count']
+
+    page_obj, querystring = paginate(request, users, ordering=('-date_joined', '-id'))
 
     context = {
-        'users': users,
+        'users': page_obj,
+        'querystring': querystring,
         'total_users': total_users,
         'admin_count': admin_count,
         'staff_count': staff_count,
@@ -869,8 +857,6 @@ def toggle_user_status(request, user_id):
 
 # API для проверки доступности
 def check_availability(request, car_id):
-    car = get_object_or_404(Car, id=car_id)
-
     if request.method == 'GET':
         start_date_str = request.GET.get('start_date')
         end_date_str = request.GET.get('end_date')
@@ -879,38 +865,46 @@ def check_availability(request, car_id):
             try:
                 start_date = datetime.datetime.fromisoformat(start_date_str)
                 end_date = datetime.datetime.fromisoformat(end_date_str)
-
-                # Проверяем пересечения
-                overlapping = Booking.objects.filter(
-                    car=car,
-                    start_date__lt=end_date,
-                    end_date__gt=start_date,
-                    status__name__in=['подтверждено', 'активно']
-                ).exists()
-
-                available = not overlapping
-
-                # Расчет стоимости
-                duration = end_date - start_date
-                hours = duration.total_seconds() / 3600
-
-                if hours <= 24:
-                    price = car.price_per_hour * hours
-                else:
-                    days = hours / 24
-                    price = car.price_per_day * days
-
-                return JsonResponse({
-                    'available': available,
-                    'price': round(price, 2),
-                    'duration_hours': round(hours, 1),
-                })
             except ValueError:
                 return JsonResponse({'error': 'Invalid date format'}, status=400)
 
+            # Доступность и цена (кешируются до изменения бронирований или тарифа)
+            result = get_quote(car_id, start_date, end_date)
+            if result is None:
+                raise Http404('Автомобиль не найден')
+            return JsonResponse(result)
+
     return JsonResponse({'error': 'Missing parameters'}, status=400)
 
 
+# API поиска свободных автомобилей на период
+def available_cars_api(request):
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+
+    if not start_date_str or not end_date_str:
+        return JsonResponse({'error': 'Missing parameters'}, status=400)
+
+    try:
+        start_date = _parse_datetime(start_date_str)
+        end_date = _parse_datetime(end_date_str)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date format'}, status=400)
+
+    if end_date <= start_date:
+        return JsonResponse({'error': 'Invalid date range'}, status=400)
+
+    cars = available_cars(start_date, end_date).order_by('-created_at').values(
+        'id', 'brand', 'model', 'year', 'price_per_hour', 'price_per_day',
+        'category_id', 'transmission_id', 'address'
+    )
+
+    return JsonResponse({
+        'count': len(cars),
+        'cars': list(cars),
+    })
+
+
 # Страница бронирования (отдельная)
 @login_required
 def book_car_page(request, car_id):
@@ -944,8 +938,8 @@ def manager_dashboard(request):
     # Статистика для менеджера
     stats = {
         'total_bookings': Booking.objects.count(),
-        'pending_bookings': Booking.objects.filter(status__name='подтверждено').count(),
-        'active_bookings': Booking.objects.filter(status__name='активно').count(),
+        'pending_bookings': Booking.objects.filter(status_id=booking_statuses.id(BOOKING_CONFIRMED)).count(),
+        'active_bookings': Booking.objects.filter(status_id=booking_statuses.id(BOOKING_ACTIVE)).count(),
         'today_bookings': Booking.objects.filter(
             start_date__date=datetime.datetime.now().date()
         ).count(),
@@ -958,7 +952,7 @@ def manager_dashboard(request):
 
     # Бронирования, требующие внимания
     pending_bookings = Booking.objects.filter(
-        status__name='подтверждено'
+        status_id=booking_statuses.id(BOOKING_CONFIRMED)
     ).select_related('car', 'client').order_by('start_date')[:5]
 
     context = {
@@ -1004,20 +998,19 @@ def manager_bookings(request):
     # Получаем все статусы для фильтра
     statuses = BookingStatus.objects.all()
 
-    # Статистика
-    total_bookings = bookings.count()
-    active_count = bookings.filter(status__name='активно').count()
-    confirmed_count = bookings.filter(status__name='подтверждено').count()
-    completed_count = bookings.filter(status__name='завершено').count()
+    # Статистика (один GROUP BY вместо отдельных count())
+    status_counts = count_by_status(bookings)
+    total_bookings = sum(status_counts.values())
+    active_count = status_counts.get(booking_statuses.id(BOOKING_ACTIVE), 0)
+    confirmed_count = status_counts.get(booking_statuses.id(BOOKING_CONFIRMED), 0)
+    completed_count = status_counts.get(booking_statuses.id(BOOKING_COMPLETED), 0)
 
-    # Пагинация
-    from django.core.paginator import Paginator
-    paginator = Paginator(bookings, 20)  # 20 бронирований на страницу
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Пагинация по ключу (created_at, id)
+    page_obj, querystring = paginate(request, bookings)
 
     context = {
         'bookings': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'selected_status': status_filter,
         'total_bookings': total_bookings,
@@ -1038,17 +1031,12 @@ def confirm_booking(request, booking_id):
 
     if request.method == 'POST':
         # Получаем статус "активно"
-        active_status = BookingStatus.objects.get(name='активно')
-        old_status = booking.status.name
+        active_status = booking_statuses.get(BOOKING_ACTIVE)
+        old_status = booking_statuses.name(booking.status_id)
 
         booking.status = active_status
         booking.save()
 
-        # Меняем статус автомобиля
-        booked_status = CarStatus.objects.get(name='забронирован')
-        booking.car.status = booked_status
-        booking.car.save()
-
         messages.success(request,
                          f'Бронирование #{booking.id} подтверждено! Статус изменен с "{old_status}" на "активно"')
 
@@ -1080,19 +1068,17 @@ def manager_cars(request):
     statuses = CarStatus.objects.all()
     categories = CarCategory.objects.all()
 
-    # Подсчет статистики
-    total_cars = cars.count()
-    available_count = 0
-    booked_count = 0
+    # Подсчет статистики (GROUP BY на стороне БД)
+    counts = count_availability(cars)
+    total_cars = counts['total_cars']
+    available_count = counts['available_cars']
+    booked_count = counts['booked_cars']
 
-    for car in cars:
-        if car.status.name == 'доступен':
-            available_count += 1
-        elif car.status.name == 'забронирован':
-            booked_count += 1
+    page_obj, querystring = paginate(request, cars)
 
     context = {
-        'cars': cars,
+        'cars': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'categories': categories,
         'selected_status': status_filter,
@@ -1124,18 +1110,18 @@ def partner_dashboard(request):
     total_bookings = Booking.objects.filter(car__in=cars).count()
     active_bookings = Booking.objects.filter(
         car__in=cars,
-        status__name__in=['подтверждено', 'активно']
+        status_id__in=booking_statuses.ids(BLOCKING_STATUSES)
     ).count()
     completed_bookings = Booking.objects.filter(
         car__in=cars,
-        status__name='завершено'
+        status_id=booking_statuses.id(BOOKING_COMPLETED)
     ).count()
 
-    # Доход
-    total_revenue = Booking.objects.filter(
-        car__in=cars,
-        status__name='завершено'
-    ).aggregate(total=Sum('calculated_price'))['total'] or 0
+    # Доход (ведется журналом партнера) и за текущий месяц
+    total_revenue = User.objects.filter(pk=user.pk).values_list('total_earned', flat=True).get()
+    month_revenue = revenue_for_month(
+        MonthlyRevenue.objects.filter(partner=user), month_of(timezone.now())
+    )
 
     # Последние бронирования
     recent_bookings = Booking.objects.filter(
@@ -1143,9 +1129,17 @@ def partner_dashboard(request):
     ).select_related('car', 'client', 'status').order_by('-created_at')[:10]
 
     # Автомобили
-    cars_count = cars.count()
-    available_cars = cars.filter(status__name='доступен').count()
-    booked_cars = cars.filter(status__name='забронирован').count()
+    counts = count_availability(cars)
+    cars_count = counts['total_cars']
+    available_cars = counts['available_cars']
+    booked_cars = counts['booked_cars']
+
+    # Загрузка автомобилей за 30 дней
+    utilization = get_utilization_report(DASHBOARD_PERIOD_DAYS, partner_id=user.pk)
+    car_utilization = sorted(
+        [(car, utilization['cars'][car.pk]) for car in cars if car.pk in utilization['cars']],
+        key=lambda row: row[1].rate, reverse=True
+    )
 
     context = {
         'cars': cars[:5],  # Последние 5 авто
@@ -1156,6 +1150,10 @@ def partner_dashboard(request):
         'active_bookings': active_bookings,
         'completed_bookings': completed_bookings,
         'total_revenue': total_revenue,
+        'month_revenue': month_revenue,
+        'utilization_days': DASHBOARD_PERIOD_DAYS,
+        'fleet_utilization': utilization['fleet'],
+        'car_utilization': car_utilization,
         'recent_bookings': recent_bookings,
         'user': user,
     }
@@ -1194,8 +1192,11 @@ def partner_cars(request):
 
     statuses = CarStatus.objects.all()
 
+    page_obj, querystring = paginate(request, cars)
+
     context = {
-        'cars': cars,
+        'cars': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'selected_status': status_filter,
         'total_cars': cars.count(),
@@ -1215,7 +1216,7 @@ def partner_add_car(request):
             car = form.save(commit=False)
             car.partner = request.user
             # Статус "доступен" по умолчанию
-            available_status = CarStatus.objects.get(name='доступен')
+            available_status = car_statuses.get(CAR_AVAILABLE)
             car.status = available_status
             car.save()
             messages.success(request, f'Автомобиль {car.brand} {car.model} успешно добавлен!')
@@ -1239,6 +1240,41 @@ def partner_add_car(request):
     return render(request, 'cars/partner/add_car.html', context)
 
 
+@login_required
+def partner_import_cars(request):
+    """Массовое добавление автомобилей партнером из CSV"""
+    if not request.user.is_partner:
+        return redirect('become_partner')
+
+    result = None
+    if request.method == 'POST':
+        form = CarImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = import_cars(
+                form.cleaned_data['file'],
+                request.user,
+                partial=form.cleaned_data['partial'],
+                max_rows=MAX_UPLOAD_ROWS,
+            )
+            if result.created:
+                messages.success(request, f'Добавлено автомобилей: {result.created}')
+            if result.ok:
+                return redirect('partner_cars')
+            if not result.created:
+                messages.error(request, 'Автомобили не добавлены: исправьте ошибки и загрузите файл снова')
+    else:
+        form = CarImportUploadForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'columns': IMPORT_FIELDS,
+        'transmissions': TransmissionType.objects.all(),
+        'categories': CarCategory.objects.all(),
+    }
+    return render(request, 'cars/partner/import_cars.html', context)
+
+
 @login_required
 def partner_edit_car(request, car_id):
     """Редактирование автомобиля партнером"""
@@ -1266,7 +1302,7 @@ def partner_delete_car(request, car_id):
     car = get_object_or_404(Car, id=car_id, partner=request.user)
 
     if request.method == 'POST':
-        car.delete()
+        delete_car_with_media(car)
         messages.success(request, 'Автомобиль успешно удален')
         return redirect('partner_cars')
 
@@ -1310,18 +1346,22 @@ def partner_bookings(request):
     statuses = BookingStatus.objects.all()
 
     # Статистика
-    total_bookings = bookings.count()
-    active_count = bookings.filter(status__name='активно').count()
-    confirmed_count = bookings.filter(status__name='подтверждено').count()
-    completed_count = bookings.filter(status__name='завершено').count()
+    status_counts = count_by_status(bookings)
+    total_bookings = sum(status_counts.values())
+    active_count = status_counts.get(booking_statuses.id(BOOKING_ACTIVE), 0)
+    confirmed_count = status_counts.get(booking_statuses.id(BOOKING_CONFIRMED), 0)
+    completed_count = status_counts.get(booking_statuses.id(BOOKING_COMPLETED), 0)
 
     # Доход
     total_revenue = bookings.filter(
-        status__name='завершено'
+        status_id=booking_statuses.id(BOOKING_COMPLETED)
     ).aggregate(total=Sum('calculated_price'))['total'] or 0
 
+    page_obj, querystring = paginate(request, bookings)
+
     context = {
-        'bookings': bookings,
+        'bookings': page_obj,
+        'querystring': querystring,
         'statuses': statuses,
         'selected_status': status_filter,
         'total_bookings': total_bookings,
@@ -1354,36 +1394,53 @@ def partner_booking_detail(request, booking_id):
     return render(request, 'cars/partner/booking_detail.html', context)
 
 
+@login_required
+def export_data(request, kind, fmt):
+    """Выгрузка бронирований, платежей или выплат в CSV/XLSX"""
+    export = EXPORTS.get(kind)
+    if export is None or fmt not in (CSV, XLSX):
+        raise Http404
+    if fmt == XLSX and not xlsx_available():
+        messages.error(request, 'Выгрузка в XLSX недоступна, используйте CSV')
+        return redirect(request.META.get('HTTP_REFERER') or 'home')
+
+    try:
+        queryset = filter_queryset(
+            export,
+            scoped_queryset(export, request.user),
+            status=request.GET.get('status'),
+            date_from=request.GET.get('date_from'),
+            date_to=request.GET.get('date_to'),
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    return export_response(export, queryset, fmt)
+
+
 @login_required
 def partner_finance(request):
     """Финансовая статистика партнера"""
     if not request.user.is_partner:
         return redirect('become_partner')
 
-    bookings = Booking.objects.filter(
-        car__partner=request.user,
-        status__name='завершено'
-    ).order_by('-end_date')
-
-    # Общая статистика
-    total_revenue = bookings.aggregate(total=Sum('calculated_price'))['total'] or 0
-
-    # Статистика по месяцам
-    from django.db.models.functions import TruncMonth
-    monthly_stats = bookings.annotate(
-        month=TruncMonth('end_date')
-    ).values('month').annotate(
-        total=Sum('calculated_price'),
-        count=Count('id')
-    ).order_by('-month')
+    # Общая статистика (ведется журналом партнера)
+    balance = User.objects.filter(pk=request.user.pk).values('total_earned', 'balance').get()
+    total_revenue = balance['total_earned']
+
+    # Статистика по месяцам (сводная таблица, см. cars.revenue)
+    monthly_stats = monthly_totals(MonthlyRevenue.objects.filter(partner=request.user))
 
     # Выплаты
     payouts = PartnerPayout.objects.filter(partner=request.user).order_by('-created_at')
-    total_paid = payouts.filter(status='completed').aggregate(total=Sum('amount'))['total'] or 0
-    pending_payouts = payouts.filter(status='pending').aggregate(total=Sum('amount'))['total'] or 0
+    payout_totals = payouts.aggregate(
+        total_paid=Sum('amount', filter=Q(status='completed')),
+        pending=Sum('amount', filter=Q(status__in=['pending', 'processing'])),
+    )
+    total_paid = payout_totals['total_paid'] or 0
+    pending_payouts = payout_totals['pending'] or 0
 
     # Доступно к выводу
-    available_for_payout = total_revenue - total_paid
+    available_for_payout = balance['balance']
 
     context = {
         'total_revenue': total_revenue,
@@ -1405,13 +1462,14 @@ def partner_request_payout(request):
             payout = form.save(commit=False)
             payout.partner = request.user
 
-            # Проверяем, достаточно ли средств
-            available = get_available_balance(request.user)
-            if payout.amount > available:
-                messages.error(request, 'Недостаточно средств для вывода')
-                return redirect('partner_finance')
-
-            payout.save()
+            # Проверяем баланс под блокировкой: два запроса подряд не
+            # смогут вывести одни и те же деньги
+            with transaction.atomic():
+                available = get_balance(request.user.pk, lock=True)
+                if payout.amount > available:
+                    messages.error(request, 'Недостаточно средств для вывода')
+                    return redirect('partner_finance')
+                payout.save()
             messages.success(request, f'Запрос на выплату {payout.amount}₽ отправлен')
             return redirect('partner_finance')
     else:
@@ -1426,19 +1484,4 @@ def partner_request_payout(request):
 
 def get_available_balance(user):
     """Получить доступный баланс партнера"""
-    total_revenue = Booking.objects.filter(
-        car__partner=user,
-        status__name='завершено'
-    ).aggregate(total=Sum('calculated_price'))['total'] or 0
-
-    total_paid = PartnerPayout.objects.filter(
-        partner=user,
-        status='completed'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    pending = PartnerPayout.objects.filter(
-        partner=user,
-        status='pending'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-
-    return total_revenue - total_paid - pending
\ No newline at end of file
+    return get_balance(user.pk)
\ No newline at end of file
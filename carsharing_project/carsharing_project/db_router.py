@@ -0,0 +1,102 @@
+"""
+Чтение с реплики для страниц, которые только читают данные.
+
+ReplicaMiddleware включает реплику на время GET-запроса к представлениям
+из settings.REPLICA_VIEWS, ReplicaRouter направляет туда чтение моделей
+приложения cars. Запись всегда идет в основную БД.
+
+Чтобы пользователь сразу видел свое бронирование или отзыв, после
+успешного POST вошедшего пользователя его сессия на REPLICA_PIN_SECONDS
+секунд закрепляется за основной БД (анонимные и отклоненные POST сессию
+не создают). Если реплика не настроена (нет алиаса 'replica'), все идет в default.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_APPS = {'cars'}
+PIN_SESSION_KEY = '_db_pinned_until'
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """Направляет чтение внутри блока на реплику (отчеты, команды)"""
+    token = _read_alias.set(REPLICA_DB_ALIAS if replica_configured() else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_to_primary(request, seconds=None):
+    """Закрепляет сессию за основной БД (read-your-writes)"""
+    seconds = seconds if seconds is not None else getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+    request.session[PIN_SESSION_KEY] = time.time() + seconds
+
+
+def is_pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in REPLICA_APPS:
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'REPLICA_VIEWS', ()))
+
+    def __call__(self, request):
+        request._replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._replica_token is not None:
+                _read_alias.reset(request._replica_token)
+
+        user = getattr(request, 'user', None)
+        if (
+            request.method == 'POST'
+            and response.status_code < 400
+            and hasattr(request, 'session')
+            and user is not None and user.is_authenticated
+        ):
+            pin_to_primary(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in self.views
+            and replica_configured()
+            and not is_pinned(request)
+        ):
+            request._replica_token = _read_alias.set(REPLICA_DB_ALIAS)
+        return None
@@ -5,6 +5,8 @@ Django settings for carsharing_project project.
 import os
 from pathlib import Path
 
+from .database import cache_config, database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -35,6 +37,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'carsharing_project.db_router.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,11 +63,23 @@ TEMPLATES = [
 WSGI_APPLICATION = 'carsharing_project.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }}
+# По умолчанию SQLite (WAL); PostgreSQL и реплика задаются переменными
+# окружения, см. carsharing_project/database.py
+DATABASES = database_config(BASE_DIR)
+
+# Представления только для чтения, которые обслуживает реплика
+DATABASE_ROUTERS = ['carsharing_project.db_router.ReplicaRouter']
+REPLICA_VIEWS = [
+    'home', 'car_list', 'car_detail', 'available_cars_api',
+    'admin_dashboard', 'manager_dashboard', 'partner_dashboard', 'partner_finance',
+]
+# Сколько секунд после POST пользователь читает с основной БД
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# В продакшене обязателен общий кеш (CACHE_URL): локальный кеш каждого
+# процесса не видит сбросов доступности из других процессов
+CACHES = cache_config()
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,6 +108,8 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
 # Media files
+# Фото автомобилей хранятся под хешем содержимого (cars.storage), поэтому
+# веб-сервер может отдавать MEDIA_URL с Cache-Control: immutable
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -20,6 +20,7 @@ from cars.models import (
     User, Car, CarImage, Booking, CarStatus, BookingStatus,
     PaymentType, PaymentStatus, TransmissionType, CarCategory, Review, Payment
 )
+from cars.search import get_backend as get_search_backend
 
 # Словарь с тестовыми данными
 MOCK_CARS = [
@@ -239,63 +240,62 @@ def create_dictionaries():
 
 
 def create_cars(partner):
-    """Создает автомобили (без изображений)"""
-    cars_created = 0
+    """Создает автомобили (без изображений) одним bulk_create"""
+    # Справочники - одним проходом
+    transmissions = {t.name: t for t in TransmissionType.objects.all()}
+    categories = {c.name: c for c in CarCategory.objects.all()}
+    status = CarStatus.objects.get(name='доступен')
 
+    # Уже существующие автомобили
+    existing = set(Car.objects.values_list('brand', 'model', 'year'))
+
+    cars = []
     for car_data in MOCK_CARS:
-        # Получаем или создаем КПП
-        transmission, _ = TransmissionType.objects.get_or_create(name=car_data['transmission'])
+        if (car_data['brand'], car_data['model'], car_data['year']) in existing:
+            print(f"  ⏩ Автомобиль уже существует: {car_data['brand']} {car_data['model']}")
+            continue
+
+        transmission = transmissions.get(car_data['transmission'])
+        if transmission is None:
+            transmission = transmissions[car_data['transmission']] = TransmissionType.objects.create(
+                name=car_data['transmission']
+            )
 
-        # Получаем категорию (определяем по цене)
+        # Категория определяется по цене
         price = car_data['price_per_hour']
         if price < 400:
-            category = CarCategory.objects.get(name='Эконом')
+            category = categories['Эконом']
         elif price < 600:
-            category = CarCategory.objects.get(name='Комфорт')
+            category = categories['Комфорт']
         elif price < 1000:
-            category = CarCategory.objects.get(name='Бизнес')
+            category = categories['Бизнес']
         else:
-            category = CarCategory.objects.get(name='Премиум')
-
-        # Статус (доступен)
-        status = CarStatus.objects.get(name='доступен')
-
-        # Случайный адрес
-        address = random.choice(ADDRESSES)
+            category = categories['Премиум']
 
-        # Случайный пробег
-        mileage_limit = random.choice([200, 250, 300])
-
-        # Проверяем, есть ли уже такой автомобиль
-        existing_car = Car.objects.filter(
+        # Создаем новый автомобиль с ОБЯЗАТЕЛЬНЫМ partner
+        cars.append(Car(
             brand=car_data['brand'],
             model=car_data['model'],
-            year=car_data['year']
-        ).first()
-
-        if existing_car:
-            print(f"  ⏩ Автомобиль уже существует: {car_data['brand']} {car_data['model']}")
-        else:
-            # Создаем новый автомобиль с ОБЯЗАТЕЛЬНЫМ partner
-            Car.objects.create(
-                brand=car_data['brand'],
-                model=car_data['model'],
-                year=car_data['year'],
-                transmission=transmission,
-                engine_type=car_data['engine_type'],
-                price_per_hour=car_data['price_per_hour'],
-                price_per_day=car_data['price_per_day'],
-                mileage_limit=mileage_limit,
-                description=car_data['description'],
-                address=address,
-                status=status,
-                category=category,
-                partner=partner,
-            )
-            cars_created += 1
-            print(f"  ✅ Создан автомобиль: {car_data['brand']} {car_data['model']}")
-
-    print(f"✅ Всего создано {cars_created} новых автомобилей")
+            year=car_data['year'],
+            transmission=transmission,
+            engine_type=car_data['engine_type'],
+            price_per_hour=car_data['price_per_hour'],
+            price_per_day=car_data['price_per_day'],
+            mileage_limit=random.choice([200, 250, 300]),
+            description=car_data['description'],
+            address=random.choice(ADDRESSES),
+            status=status,
+            category=category,
+            partner=partner,
+        ))
+        existing.add((car_data['brand'], car_data['model'], car_data['year']))
+        print(f"  ✅ Создан автомобиль: {car_data['brand']} {car_data['model']}")
+
+    Car.objects.bulk_create(cars, batch_size=200)
+    # bulk_create не вызывает сигналы - индексируем для поиска сами
+    get_search_backend().index_cars([car for car in cars if car.pk])
+
+    print(f"✅ Всего создано {len(cars)} новых автомобилей")
 
 
 def create_bookings():